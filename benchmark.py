@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for project.py calculator
+
+Measures:
+- Per-call latency of every Calculator operation
+- Cost of invalid operands, raising versus the checked API
+- Throughput of history appends and show_history
+- End-to-end throughput of scripted main() sessions
+- Process startup time of one-shot --eval runs
+
+Results can be saved as a JSON baseline and later compared against it;
+comparison fails if any benchmark slows down past a threshold or has no
+baseline entry. Benchmarks
+listed in BUDGETS also fail whenever they exceed an absolute time budget.
+
+Usage:
+    python benchmark.py                 # Run and print results
+    python benchmark.py --save          # Run and write the baseline file
+    python benchmark.py --compare       # Run and fail on regressions
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+from project import OPERATION_NAMES, OPERATIONS, Calculator, main
+
+BASELINE_PATH = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.5  # Allowed slowdown before a benchmark fails (50%)
+BUDGETS = {"startup.eval": 0.3}  # Name -> maximum seconds per call
+
+BENCHMARKS = {}  # Name -> function taking no arguments, timed per call
+
+
+def measure(func, repeat=9):
+    """Return the best seconds per call of func over repeat timing runs."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+# Per-call latency of every Calculator operation
+
+def _operation_benchmark(name):
+    """Return a function calling operation name with typical operands."""
+    method = getattr(Calculator(), name)
+    operands = (1.5, 2.5)[:OPERATIONS[name].arity]
+    return lambda: method(*operands)
+
+
+for _name in OPERATION_NAMES:
+    BENCHMARKS[f"op.{_name}"] = _operation_benchmark(_name)
+
+
+# Invalid operands: raising and catching versus the non-raising checked API
+
+_checked_calc = Calculator()
+
+
+def _raising_divide_by_zero():
+    try:
+        _checked_calc.divide(1.5, 0.0)
+    except ValueError:
+        pass
+
+
+BENCHMARKS["raising.divide_by_zero"] = _raising_divide_by_zero
+BENCHMARKS["checked.divide_by_zero"] = lambda: _checked_calc.checked.divide(1.5, 0.0)
+
+
+# History throughput
+
+_history_calc = Calculator()
+BENCHMARKS["history.record"] = lambda: _history_calc.record("add", 5.0, 2.0, 3.0)
+BENCHMARKS["history.add_to_history"] = lambda: _history_calc.add_to_history("2 + 3", 5)
+
+_full_history = Calculator()
+for _i in range(_full_history.history.capacity):
+    _full_history.record("multiply", _i * 2.0, float(_i), 2.0)
+
+
+def _show_history():
+    with contextlib.redirect_stdout(io.StringIO()):
+        _full_history.show_history()
+
+
+BENCHMARKS["history.show_history"] = _show_history
+
+
+# End-to-end scripted main() sessions
+
+SESSION_INPUTS = [
+    "1", "2", "3", "",          # Addition
+    "4", "10", "0", "",         # Division by zero
+    "7", "16", "",              # Square root
+    "12", "1000", "",           # Log base 10
+    "16", "",                   # Show history
+    "18",                       # Quit
+]
+
+
+def run_session(inputs=SESSION_INPUTS):
+    """Run one interactive main() session with scripted answers."""
+    answers = iter(inputs)
+    original_input, original_argv = builtins.input, sys.argv
+    builtins.input = lambda prompt="": next(answers)
+    sys.argv = ["project.py"]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main()
+    except SystemExit:
+        pass
+    finally:
+        builtins.input, sys.argv = original_input, original_argv
+
+
+BENCHMARKS["session.main"] = run_session
+
+
+# Process startup: one-shot evaluation must not pay for unused imports
+
+EVAL_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             "project.py"), "--eval", "log10(1000) * 2"]
+
+
+def run_eval():
+    """Run project.py --eval in a fresh interpreter."""
+    subprocess.run(EVAL_COMMAND, check=True, stdout=subprocess.DEVNULL)
+
+
+BENCHMARKS["startup.eval"] = run_eval
+
+
+def run_benchmarks(names=None):
+    """Run the selected (default: all) benchmarks; return seconds per call."""
+    return {name: measure(BENCHMARKS[name]) for name in names or BENCHMARKS}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (name, baseline, current) for benchmarks slower than allowed."""
+    regressions = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected and current > expected * (1 + threshold):
+            regressions.append((name, expected, current))
+    return regressions
+
+
+def missing_baselines(results, baseline):
+    """Return the names of benchmarks in results that have no baseline entry."""
+    return [name for name in results if name not in baseline]
+
+
+def over_budget(results, budgets=BUDGETS):
+    """Return (name, budget, current) for benchmarks slower than their budget."""
+    return [(name, budgets[name], current) for name, current in results.items()
+            if name in budgets and current > budgets[name]]
+
+
+def main_benchmark(argv=None):
+    """Command-line entry point; returns an exit status."""
+    parser = argparse.ArgumentParser(description="Calculator benchmark suite")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction (default: 0.5)")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names)
+    for name, seconds in results.items():
+        print(f"{name:32} {seconds * 1e9:12.1f} ns/call")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    status = 0
+    for name, budget, current in over_budget(results):
+        print(f"OVER BUDGET {name}: {current * 1e3:.1f} ms/call "
+              f"(budget {budget * 1e3:.1f} ms)")
+        status = 1
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, expected, current in regressions:
+            print(f"REGRESSION {name}: {expected * 1e9:.1f} -> {current * 1e9:.1f} ns/call "
+                  f"({current / expected - 1:+.0%})")
+        missing = missing_baselines(results, baseline)
+        for name in missing:
+            print(f"NO BASELINE {name}: run with --save to record it")
+        if regressions or missing:
+            return 1
+        print(f"No benchmark slowed down more than {args.threshold:.0%}.")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
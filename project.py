@@ -12,16 +12,1088 @@ Author: CS50P Project
 Date: September 2025
 """
 
+import argparse
+import ast
+import bisect
+import decimal
+import heapq
+import importlib
+import itertools
+import json
 import math
+import mmap
+import os
+import struct
 import sys
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict, deque
+from fractions import Fraction
+from itertools import islice
+
+
+class _DeferredImport:
+    """Stand-in for a module that is imported on first attribute access.
+
+    Keeps one-shot runs such as --eval from paying for NumPy, asyncio and
+    multiprocessing when they never use them. The first access runs a
+    plain import under a lock, so threads racing to first use all get the
+    fully initialized module, and then replaces the module-level alias so
+    later lookups go straight to the module.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name, alias):
+        """Defer importing module name, bound at module level as alias."""
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attribute):
+        with self._lock:
+            module = importlib.import_module(self._name)
+            globals()[self._alias] = module
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return f"<deferred import of {self._name!r}>"
+
+
+np = _DeferredImport("numpy", "np")
+asyncio = _DeferredImport("asyncio", "asyncio")
+concurrent_futures = _DeferredImport("concurrent.futures", "concurrent_futures")
+
+
+# Operation registry: each operation is declared once, and the menu, history,
+# expressions, batch evaluation and server all dispatch through OPERATIONS
+
+class Operation:
+    """Declaration of one calculator operation.
+
+    name is the Calculator method name. symbol is the infix operator
+    (e.g. "+") or expression function name (e.g. "sqrt"), and aliases are
+    extra function names. checks is a sequence of (predicate, message)
+    pairs where predicate(*operands) is true for invalid operands; it
+    works on scalars and NumPy arrays alike. overflow marks operations
+    whose results may be too large to compute. kernel is the vectorized
+    implementation, or the name of a NumPy function so that NumPy is only
+    imported once a batch operation runs. func is the scalar
+    implementation for operations that are not Calculator methods, such
+    as third-party ones.
+    """
+
+    def __init__(self, name, arity, symbol, label, section="Custom Operations",
+                 kernel=None, checks=(), overflow=False, func=None, aliases=(),
+                 format=None):
+        """Declare an operation; see the class docstring for the fields."""
+        self.name = name
+        self.arity = arity
+        self.symbol = symbol
+        self.label = label
+        self.section = section
+        self._kernel = kernel
+        self.checks = tuple(checks)
+        self.overflow = overflow
+        self.func = func
+        self.aliases = tuple(aliases)
+        if format is None:
+            if symbol in OPERATOR_SYMBOLS.values():
+                format = f"{{x}} {symbol} {{y}}"
+            else:
+                format = f"{symbol}({{x}}, {{y}})" if arity == 2 else f"{symbol}({{x}})"
+        self.format = format
+
+    @property
+    def kernel(self):
+        """The vectorized implementation, resolving NumPy function names."""
+        if isinstance(self._kernel, str):
+            self._kernel = getattr(np, self._kernel)
+        return self._kernel
+
+    def describe(self, x, y=math.nan):
+        """Write the operation with its operands, as shown in the history."""
+        return self.format.format(x=x, y=y)
+
+    def checked(self, *operands):
+        """Apply func after the domain checks, raising ValueError like the built-ins."""
+        for predicate, message in self.checks:
+            if predicate(*operands):
+                raise ValueError(message)
+        try:
+            return self.func(*operands)
+        except OverflowError:
+            raise ValueError("Result too large to compute")
+
+    def __repr__(self):
+        return f"Operation({self.name!r})"
+
+
+# Infix operators usable in expressions
+OPERATOR_SYMBOLS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.Pow: "**",
+    ast.Mod: "%",
+}
+
+OPERATIONS = {}  # Name -> Operation
+OPERATION_NAMES = []  # Registration order; the index is the history code
+OPERATION_CODES = {}  # Name -> history code
+EXPRESSION_NAMES = {}  # Operator symbol or function name -> operation name
+MAX_OPERATIONS = 127  # History codes are stored as signed bytes
+
+# Status codes of the non-raising API (see CheckedCalculator). Each domain
+# check message of a registered operation gets its own code
+STATUS_OK = 0
+STATUS_OVERFLOW = 1
+STATUS_FAILED = 2  # The implementation raised an error no check anticipated
+STATUS_MESSAGES = ["OK", "Result too large to compute", "Operation failed"]  # Code -> message
+STATUS_CODES = {message: code for code, message in enumerate(STATUS_MESSAGES)}
+
+
+def register_operation(operation):
+    """Add an operation to the registry and return it.
+
+    Third-party operations must provide func (and ideally kernel); they
+    then appear in the menu, expressions, batch mode and the server, and
+    can be called as Calculator methods.
+    """
+    name = operation.name
+    if name in OPERATIONS:
+        raise ValueError(f"Operation already registered: {name}")
+    if operation.func is None and not hasattr(Calculator, name):
+        raise ValueError(f"Operation {name} needs a func")
+    if operation.func is not None and hasattr(Calculator, name):
+        raise ValueError(f"Operation name clashes with a Calculator attribute: {name}")
+    if operation.arity not in (1, 2):
+        raise ValueError("Operations take one or two operands")
+    if len(OPERATIONS) >= MAX_OPERATIONS:
+        raise ValueError("Too many registered operations")
+    for symbol in (operation.symbol, *operation.aliases):
+        if symbol in EXPRESSION_NAMES:
+            raise ValueError(f"Expression name already in use: {symbol}")
+
+    OPERATIONS[name] = operation
+    OPERATION_CODES[name] = len(OPERATION_NAMES)
+    for _, message in operation.checks:
+        if message not in STATUS_CODES:
+            STATUS_CODES[message] = len(STATUS_MESSAGES)
+            STATUS_MESSAGES.append(message)
+    OPERATION_NAMES.append(name)
+    for symbol in (operation.symbol, *operation.aliases):
+        EXPRESSION_NAMES[symbol] = name
+    return operation
+
+
+def get_operation(name):
+    """Return the registered operation called name, or raise ValueError."""
+    operation = OPERATIONS.get(name)
+    if operation is None:
+        raise ValueError(f"Unknown operation: {name}")
+    return operation
+
+
+TEXT_ENTRY = -1  # Code for free-form entries added through add_to_history
+HISTORY_INITIAL_SLOTS = 16  # History storage starts this size and doubles up to capacity
+
+
+def _fits_float_record(value):
+    """True if value can be stored as a float without losing information."""
+    if isinstance(value, float):
+        return True
+    return isinstance(value, int) and abs(value) <= EXACT_FLOAT_INTEGER_LIMIT
+
+
+class History:
+    """Fixed-capacity ring buffer of calculation records.
+
+    Each record is an operation code plus float operands and result, kept in
+    parallel typed arrays that grow by doubling up to capacity. Once full,
+    the oldest record is overwritten. Records are only formatted as strings
+    when they are read.
+    """
+
+    def __init__(self, capacity=1000):
+        """Create an empty history keeping at most capacity records."""
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        slots = min(capacity, HISTORY_INITIAL_SLOTS)
+        self._codes = array('b', [0]) * slots
+        self._x = array('d', [0.0]) * slots
+        self._y = array('d', [0.0]) * slots
+        self._results = array('d', [0.0]) * slots
+        self._text = {}  # Slot -> (operation, result) for free-form entries
+        self._start = 0
+        self._size = 0
+
+    def _next_slot(self):
+        """Claim the slot for a new record, evicting the oldest if full."""
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            if slot == len(self._codes):
+                self._grow()
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._text.pop(slot, None)
+        return slot
+
+    def _grow(self):
+        """Double the storage, up to capacity.
+
+        The arrays are replaced rather than resized in place, so readers
+        still holding (or exporting buffers of) the old ones are unaffected.
+        """
+        extra = min(len(self._codes), self.capacity - len(self._codes))
+        self._codes = self._codes + array('b', [0]) * extra
+        self._x = self._x + array('d', [0.0]) * extra
+        self._y = self._y + array('d', [0.0]) * extra
+        self._results = self._results + array('d', [0.0]) * extra
+
+    def append(self, name, result, x, y=math.nan):
+        """Record a calculation by operation name, result and operands."""
+        if not (type(result) is type(x) is type(y) is float
+                or all(_fits_float_record(v) for v in (result, x, y))):
+            # Complex, Decimal or huge integer values do not fit a float record
+            self.append_text(OPERATIONS[name].describe(x, y), result)
+            return
+        slot = self._next_slot()
+        self._codes[slot] = OPERATION_CODES[name]
+        self._x[slot] = x
+        self._y[slot] = y
+        self._results[slot] = result
+
+    def append_text(self, operation, result):
+        """Record a free-form operation description and its result."""
+        slot = self._next_slot()
+        self._codes[slot] = TEXT_ENTRY
+        self._text[slot] = (operation, _printable(result))
+
+    def _format(self, slot):
+        """Format the record in slot as "operation = result"."""
+        code = self._codes[slot]
+        if code == TEXT_ENTRY:
+            operation, result = self._text[slot]
+        else:
+            operation = OPERATIONS[OPERATION_NAMES[code]].describe(self._x[slot], self._y[slot])
+            result = self._results[slot]
+        return f"{operation} = {result}"
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        """Return the formatted record at index (oldest first); supports slices."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return self._format((self._start + index) % self.capacity)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def clear(self):
+        """Remove every record."""
+        self._text.clear()
+        self._start = 0
+        self._size = 0
+
+
+class _HistoryShard(History):
+    """One thread's History, tagging each record with a global sequence number.
+
+    Only the owning thread writes. A slot's sequence number is reset to -1
+    while the slot is rewritten, so readers in other threads can detect and
+    skip records that change under them.
+    """
+
+    def __init__(self, capacity, counter):
+        """Create an empty shard drawing sequence numbers from counter."""
+        super().__init__(capacity)
+        self._thread = weakref.ref(threading.current_thread())  # Not kept alive by us
+        self._seqs = array('q', [-1]) * len(self._codes)
+        self._counter = counter
+        self._slot = 0
+
+    def _grow(self):
+        History._grow(self)
+        self._seqs = self._seqs + array('q', [-1]) * (len(self._codes) - len(self._seqs))
+
+    def _next_slot(self):
+        slot = self._slot = History._next_slot(self)
+        self._seqs[slot] = -1  # Invalid until the record is complete
+        return slot
+
+    def append(self, name, result, x, y=math.nan):
+        History.append(self, name, result, x, y)
+        self._seqs[self._slot] = next(self._counter)
+
+    def append_text(self, operation, result):
+        History.append_text(self, operation, result)
+        self._seqs[self._slot] = next(self._counter)
+
+    def entries(self, after, limit):
+        """Return up to limit (sequence, shard, slot) for the newest complete
+        records numbered above after, newest first."""
+        seqs, start, size, capacity = self._seqs, self._start, self._size, self.capacity
+        entries = []
+        for index in range(size - 1, -1, -1):
+            slot = (start + index) % capacity
+            seq = seqs[slot]
+            if seq < 0:  # Being written right now
+                continue
+            if seq <= after or len(entries) == limit:
+                break
+            entries.append((seq, self, slot))
+        return entries
+
+    def count(self, after):
+        """Return the number of complete records numbered above after."""
+        return sum(seq > after for seq in self._seqs)
+
+    def newest(self):
+        """Return the sequence number of the newest record, or -1."""
+        return self._seqs[(self._start + self._size - 1) % self.capacity] if self._size else -1
+
+    def finished(self):
+        """True once the owning thread has ended."""
+        thread = self._thread()
+        return thread is None or not thread.is_alive()
+
+    def format(self, seq, slot):
+        """Format a record, or return None if it was overwritten meanwhile."""
+        try:
+            text = self._format(slot)
+        except KeyError:  # Free-form text replaced while reading
+            return None
+        return text if self._seqs[slot] == seq else None
+
+
+class ShardedHistory:
+    """Thread-safe calculation history built from per-thread History shards.
+
+    Each thread appends to its own ring buffer without locking; records
+    carry numbers from a shared counter, and reads merge every shard back
+    into one oldest-first sequence holding the newest capacity records.
+    clear() only moves a watermark, so it never races with appends. Shards
+    of finished threads are dropped once none of their records is among the
+    newest; that is checked on full reads and whenever the number of shards
+    has doubled. The interface matches History.
+    """
+
+    def __init__(self, capacity=1000):
+        """Create an empty history keeping at most capacity records."""
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self._counter = itertools.count()  # Shared sequence numbers
+        self._cleared = -1  # Records numbered up to this one were cleared
+        self._local = threading.local()
+        self._shards = []
+        self._prune_at = 8  # Shard count at which finished threads' shards are pruned
+        self._lock = threading.Lock()  # Guards _shards; appends take it once per thread
+
+    def _shard(self):
+        """Return the calling thread's shard, creating it on first use."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _HistoryShard(self.capacity, self._counter)
+            with self._lock:
+                self._shards.append(shard)
+                prune = len(self._shards) >= self._prune_at
+            if prune:
+                self._entries()  # A full read drops stale shards
+                with self._lock:
+                    self._prune_at = max(8, 2 * len(self._shards))
+            return shard
+
+    def append(self, name, result, x, y=math.nan):
+        """Record a calculation by operation name, result and operands."""
+        self._shard().append(name, result, x, y)
+
+    def append_text(self, operation, result):
+        """Record a free-form operation description and its result."""
+        self._shard().append_text(operation, result)
+
+    def _entries(self, limit=None):
+        """Merge the shards: the newest limit (at most capacity) records, oldest first.
+
+        When reading all of them, shards of finished threads are dropped if
+        none of their records is among the newest.
+        """
+        limit = self.capacity if limit is None else min(limit, self.capacity)
+        with self._lock:
+            shards = list(self._shards)
+        # Decided before reading: a thread finishing mid-read may still add records
+        finished = [shard for shard in shards if shard.finished()] if limit == self.capacity else []
+        cleared = self._cleared
+        if len(shards) == 1:
+            entries = shards[0].entries(cleared, limit)
+        else:
+            entries = heapq.nlargest(
+                limit, (entry for shard in shards for entry in shard.entries(cleared, limit)))
+        entries.reverse()
+        if limit == self.capacity:
+            kept = {id(shard) for _, shard, _ in entries}
+            stale = [shard for shard in finished if id(shard) not in kept]
+            if stale:
+                with self._lock:
+                    self._shards = [shard for shard in self._shards if shard not in stale]
+        return entries
+
+    def __len__(self):
+        cleared = self._cleared
+        with self._lock:
+            shards = list(self._shards)
+        return min(sum(shard.count(cleared) for shard in shards), self.capacity)
+
+    def __bool__(self):
+        cleared = self._cleared
+        with self._lock:
+            return any(shard.newest() > cleared for shard in self._shards)
+
+    def __getitem__(self, index):
+        """Return the formatted record at index (oldest first); supports slices."""
+        limit = None  # Reading only the newest records is cheaper
+        if isinstance(index, slice):
+            if index.start is not None and index.start < 0 and index.step in (None, 1) \
+                    and (index.stop is None or index.stop < 0):
+                limit = -index.start
+        elif index < 0:
+            limit = -index
+        entries = self._entries(limit)
+        if isinstance(index, slice):
+            texts = (shard.format(seq, slot) for seq, shard, slot in entries[index])
+            return [text for text in texts if text is not None]
+        if index < 0:
+            index += len(entries)
+        if not 0 <= index < len(entries):
+            raise IndexError("history index out of range")
+        seq, shard, slot = entries[index]
+        text = shard.format(seq, slot)
+        if text is None:
+            raise IndexError("history record was overwritten while reading")
+        return text
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def columns(self):
+        """Return the records, oldest first, as result columns (see save_columns).
+
+        Free-form entries have code TEXT_ENTRY and NaN operands; their
+        result is NaN unless it converts to a float.
+        """
+        entries = self._entries()
+        seqs = np.array([seq for seq, _, _ in entries], dtype=np.int64)
+        slots = np.array([slot for _, _, slot in entries], dtype=np.intp)
+        owners = [shard for _, shard, _ in entries]
+        codes = np.empty(len(entries), dtype=np.int8)
+        x, y, results = np.empty(len(entries)), np.empty(len(entries)), np.empty(len(entries))
+        valid = np.ones(len(entries), dtype=bool)
+        for shard in set(owners):
+            rows = np.flatnonzero([owner is shard for owner in owners])
+            taken = slots[rows]
+            codes[rows] = np.frombuffer(shard._codes, dtype=np.int8)[taken]
+            x[rows] = np.frombuffer(shard._x)[taken]
+            y[rows] = np.frombuffer(shard._y)[taken]
+            results[rows] = np.frombuffer(shard._results)[taken]
+            # Skip records overwritten while they were copied
+            valid[rows] = np.frombuffer(shard._seqs, dtype=np.int64)[taken] == seqs[rows]
+
+        for row in np.flatnonzero(codes == TEXT_ENTRY):
+            x[row] = y[row] = math.nan
+            try:
+                results[row] = float(owners[row]._text[slots[row]][1])
+            except (KeyError, TypeError, ValueError, OverflowError):
+                results[row] = math.nan
+        return {
+            "code": codes[valid],
+            "x": x[valid],
+            "y": y[valid],
+            "result": results[valid],
+            "error": np.zeros(int(valid.sum()), dtype=bool),
+        }
+
+    def clear(self):
+        """Remove every record appended so far."""
+        self._cleared = next(self._counter)
+
+
+# On-disk history log: a header followed by fixed-size little-endian records
+LOG_MAGIC = b"CALCLOG1"
+LOG_HEADER = struct.Struct("<8sI4x")
+LOG_RECORD = struct.Struct("<ddddb7x")  # timestamp, x, y, result, code
+LOG_DTYPE = [  # Structured dtype of one record, as a spec for np.dtype
+    ("timestamp", "<f8"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("result", "<f8"),
+    ("code", "i1"),
+    ("padding", "V7"),
+]
+
+
+class HistoryLog:
+    """Append-only binary history log with batched writes.
+
+    Records are buffered in memory and written batch_size at a time, or on
+    flush() and close(). Timestamps never decrease, which lets readers find
+    time ranges by binary search.
+    """
+
+    def __init__(self, path, batch_size=256):
+        """Open (or create) the log at path for appending."""
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer = bytearray()
+        self._pending = 0
+        self._last_timestamp = 0.0
+        self._lock = threading.Lock()  # Appends may come from several threads
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "r+b") as f:
+                _check_log_header(f.read(LOG_HEADER.size), path)
+                records = (os.path.getsize(path) - LOG_HEADER.size) // LOG_RECORD.size
+                size = LOG_HEADER.size + records * LOG_RECORD.size
+                f.truncate(size)  # Drop a partial record left by a torn write
+                if records:
+                    f.seek(size - LOG_RECORD.size)
+                    self._last_timestamp = LOG_RECORD.unpack(f.read(LOG_RECORD.size))[0]
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_RECORD.size))
+            self._file.flush()
+
+    def append(self, name, result, x, y=math.nan, timestamp=None):
+        """Queue one calculation record; writes happen once per batch."""
+        if timestamp is None:
+            timestamp = time.time()
+        code = OPERATION_CODES[name]
+        with self._lock:
+            timestamp = max(timestamp, self._last_timestamp)
+            self._last_timestamp = timestamp
+            self._buffer += LOG_RECORD.pack(timestamp, x, y, result, code)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._write()
+
+    def _write(self):
+        """Write buffered records and flush the file; the lock must be held."""
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self._pending = 0
+        self._file.flush()
+
+    def flush(self):
+        """Write any buffered records to disk."""
+        with self._lock:
+            self._write()
+
+    def close(self):
+        """Flush buffered records and close the file."""
+        with self._lock:
+            if not self._file.closed:
+                self._write()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_log_header(header, path):
+    """Raise ValueError unless header belongs to a history log."""
+    if len(header) < LOG_HEADER.size:
+        raise ValueError(f"Not a calculator history log: {path}")
+    magic, record_size = LOG_HEADER.unpack(header)
+    if magic != LOG_MAGIC or record_size != LOG_RECORD.size:
+        raise ValueError(f"Not a calculator history log: {path}")
+
+
+class HistoryLogReader:
+    """Memory-mapped, indexed reader for a history log.
+
+    Records are viewed in place through mmap, so millions of entries can be
+    queried without loading them. Timestamp ranges are found by binary
+    search and each operation keeps a sorted index of its record positions,
+    so a query only touches the records it returns.
+    """
+
+    def __init__(self, path):
+        """Map the log at path and build its indexes."""
+        self.path = path
+        self._file = open(path, "rb")
+        _check_log_header(self._file.read(LOG_HEADER.size), path)
+        self._mmap = None
+        self._records = np.empty(0, dtype=LOG_DTYPE)
+        self._operation_index = {}
+        self.refresh()
+
+    def refresh(self):
+        """Pick up records appended since the last refresh and index them."""
+        size = os.path.getsize(self.path)
+        count = (size - LOG_HEADER.size) // LOG_RECORD.size
+        indexed = len(self._records)
+        if count == indexed:
+            return
+
+        # The previous map is released once no returned records refer to it
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._records = np.frombuffer(self._mmap, dtype=LOG_DTYPE,
+                                      count=count, offset=LOG_HEADER.size)
+
+        new_codes = self._records["code"][indexed:]
+        for code in np.unique(new_codes):
+            positions = np.flatnonzero(new_codes == code) + indexed
+            previous = self._operation_index.get(int(code))
+            if previous is not None:
+                positions = np.concatenate([previous, positions])
+            self._operation_index[int(code)] = positions
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index].copy()
+
+    def query(self, operation=None, since=None, until=None):
+        """Return records for operation with since <= timestamp < until.
+
+        Any filter left as None is not applied. The result is a structured
+        NumPy array with timestamp, x, y, result and code fields.
+        """
+        timestamps = self._records["timestamp"]
+        start = 0 if since is None else int(np.searchsorted(timestamps, since, "left"))
+        stop = len(timestamps) if until is None else int(np.searchsorted(timestamps, until, "left"))
+
+        if operation is None:
+            return self._records[start:stop].copy()
+
+        positions = self._operation_index.get(OPERATION_CODES[operation])
+        if positions is None:
+            return np.empty(0, dtype=LOG_DTYPE)
+        lo, hi = np.searchsorted(positions, [start, stop])
+        return self._records[positions[lo:hi]]
+
+    def format(self, record):
+        """Format a record the same way the in-memory history does."""
+        operation = OPERATIONS[OPERATION_NAMES[record["code"]]].describe(
+            float(record["x"]), float(record["y"]))
+        return f"{operation} = {float(record['result'])}"
+
+    def close(self):
+        """Release the mapping and close the file."""
+        self._records = np.empty(0, dtype=LOG_DTYPE)
+        self._operation_index = {}
+        self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Operations eligible for memoization (the comparatively expensive ones)
+MEMOIZED_OPERATIONS = (
+    "sine", "cosine", "tangent", "natural_log", "log_base_10", "exponential", "power",
+)
+
+
+def _memo_tag(value):
+    """Key part telling apart equal arguments with different results: the
+    type, and for floats the sign, since -0.0 == 0.0."""
+    return math.copysign(1.0, value) if type(value) is float else type(value)
+
+
+class MemoCache:
+    """Bounded LRU cache of operation results, including raised errors."""
+
+    def __init__(self, maxsize=1024):
+        """Initialize an empty cache holding at most maxsize entries."""
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def wrap(self, name, func):
+        """Return a memoized version of func, cached under the operation name."""
+        entries = self._entries
+
+        def memoized(*args):
+            # Types are part of the key so that, for example, 2 ** 3 and 2.0 ** 3.0
+            # differ; so are float signs, as sine(-0.0) is -0.0
+            key = (name, args, tuple(map(_memo_tag, args)))
+            try:
+                is_error, value = entries[key]
+            except KeyError:
+                self.misses += 1
+                try:
+                    value = func(*args)
+                    is_error = False
+                except ValueError as e:
+                    value = e
+                    is_error = True
+                entries[key] = (is_error, value)
+                if len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.hits += 1
+                try:
+                    entries.move_to_end(key)
+                except KeyError:  # Evicted by another thread meanwhile
+                    pass
+            if is_error:
+                raise type(value)(*value.args)
+            return value
+
+        memoized.__name__ = name
+        memoized.__doc__ = func.__doc__
+        return memoized
+
+    def __len__(self):
+        return len(self._entries)
+
+    def info(self):
+        """Return hit, miss and eviction counters plus current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 1e-4, 1e-3, math.inf)
+
+
+class OperationStats:
+    """Call count, error counts and latency histogram for one operation."""
+
+    __slots__ = ("calls", "errors", "seconds", "buckets")
+
+    def __init__(self, bucket_count):
+        self.calls = 0
+        self.errors = {}  # Exception type name -> count
+        self.seconds = 0.0
+        self.buckets = [0] * bucket_count
+
+
+class Metrics:
+    """Per-operation instrumentation with JSON and Prometheus export."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize empty metrics using the given histogram bucket bounds."""
+        self.bucket_bounds = tuple(buckets)
+        self.operations = {}  # Operation name -> OperationStats
+
+    def wrap(self, name, func):
+        """Return a version of func that records its calls under name."""
+        stats = self.operations.setdefault(name, OperationStats(len(self.bucket_bounds)))
+        bounds = self.bucket_bounds
+        clock = time.perf_counter
+
+        def instrumented(*args):
+            start = clock()
+            try:
+                return func(*args)
+            except Exception as e:
+                kind = type(e).__name__
+                stats.errors[kind] = stats.errors.get(kind, 0) + 1
+                raise
+            finally:
+                elapsed = clock() - start
+                stats.calls += 1
+                stats.seconds += elapsed
+                stats.buckets[bisect.bisect_left(bounds, elapsed)] += 1
+
+        instrumented.__name__ = name
+        instrumented.__doc__ = func.__doc__
+        return instrumented
+
+    def snapshot(self):
+        """Return the current metrics as a JSON-serializable dict."""
+        return {
+            name: {
+                "calls": stats.calls,
+                "errors": dict(stats.errors),
+                "seconds": stats.seconds,
+                "histogram": {
+                    str(bound): count
+                    for bound, count in zip(self.bucket_bounds, stats.buckets)
+                },
+            }
+            for name, stats in self.operations.items()
+            if stats.calls
+        }
+
+    def to_prometheus(self):
+        """Return the current metrics in Prometheus text exposition format."""
+        lines = [
+            "# HELP calculator_operation_calls_total Calls per operation.",
+            "# TYPE calculator_operation_calls_total counter",
+        ]
+        active = [(name, stats) for name, stats in self.operations.items() if stats.calls]
+        for name, stats in active:
+            lines.append(f'calculator_operation_calls_total{{operation="{name}"}} {stats.calls}')
+
+        lines += [
+            "# HELP calculator_operation_errors_total Errors per operation and type.",
+            "# TYPE calculator_operation_errors_total counter",
+        ]
+        for name, stats in active:
+            for kind, count in stats.errors.items():
+                lines.append(
+                    f'calculator_operation_errors_total{{operation="{name}",type="{kind}"}} {count}'
+                )
+
+        lines += [
+            "# HELP calculator_operation_seconds Operation latency.",
+            "# TYPE calculator_operation_seconds histogram",
+        ]
+        for name, stats in active:
+            cumulative = 0
+            for bound, count in zip(self.bucket_bounds, stats.buckets):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(
+                    f'calculator_operation_seconds_bucket{{operation="{name}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'calculator_operation_seconds_sum{{operation="{name}"}} {stats.seconds!r}')
+            lines.append(f'calculator_operation_seconds_count{{operation="{name}"}} {stats.calls}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, format=None):
+        """Write a snapshot to path atomically.
+
+        format is "json" or "prometheus"; by default it is "json" for
+        paths ending in .json and "prometheus" otherwise.
+        """
+        if format is None:
+            format = "json" if str(path).endswith(".json") else "prometheus"
+        if format == "json":
+            text = json.dumps(self.snapshot(), indent=2) + "\n"
+        elif format == "prometheus":
+            text = self.to_prometheus()
+        else:
+            raise ValueError(f"Unknown metrics format: {format}")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def reset(self):
+        """Zero every counter."""
+        for stats in self.operations.values():
+            stats.__init__(len(self.bucket_bounds))
+
+
+# Precision modes: "float" uses native floats only; "adaptive" starts with
+# floats and escalates to exact or high-precision arithmetic when needed
+PRECISION_MODES = ("float", "adaptive")
+EXACT_FLOAT_INTEGER_LIMIT = 2 ** 53  # Integers above this may not be exact floats
+DECIMAL_CONTEXT = decimal.Context(prec=50, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+# Exact results longer than this are rounded to Decimal; Python refuses to
+# convert ints of more than 4300 digits to strings by default
+MAX_EXACT_DIGITS = 4000
+_MAX_EXACT_BITS = int(MAX_EXACT_DIGITS * math.log2(10))
+
+
+def _printable(value):
+    """Return value, or its DECIMAL_CONTEXT Decimal if it is an int or
+    Fraction with more than MAX_EXACT_DIGITS digits."""
+    if isinstance(value, int):
+        if value.bit_length() > _MAX_EXACT_BITS:
+            return DECIMAL_CONTEXT.create_decimal(value)
+    elif isinstance(value, Fraction):
+        if max(value.numerator.bit_length(), value.denominator.bit_length()) > _MAX_EXACT_BITS:
+            return DECIMAL_CONTEXT.divide(decimal.Decimal(value.numerator),
+                                          decimal.Decimal(value.denominator))
+    return value
+
+
+def _is_integral(value):
+    """True for ints and integer-valued floats."""
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, int)
+
+
+def power_by_squaring(base, exponent, modulus=None):
+    """Compute base ** exponent (mod modulus) for a non-negative integer exponent.
+
+    Uses O(log exponent) multiplications and works for ints, Fractions and
+    floats; with a modulus the intermediate values stay small.
+    """
+    if modulus is not None:
+        base %= modulus
+    result = 1
+    while exponent:
+        if exponent & 1:
+            result *= base
+            if modulus is not None:
+                result %= modulus
+        exponent >>= 1
+        if exponent:
+            base *= base
+            if modulus is not None:
+                base %= modulus
+    return result if modulus is None else result % modulus
+
+
+def _exact_bits(base, exponent):
+    """Estimate the bits of the larger part of base ** exponent (an int or
+    Fraction) from exponent * log2 of the base's numerator or denominator."""
+    if isinstance(base, Fraction):
+        size = max(math.log2(abs(base.numerator) or 1), math.log2(base.denominator))
+    else:
+        size = math.log2(abs(base) or 1)
+    return abs(exponent) * size
+
+
+def _to_decimal(value):
+    """Convert an int, float, Fraction or Decimal to a Decimal."""
+    if isinstance(value, Fraction):
+        return DECIMAL_CONTEXT.divide(decimal.Decimal(value.numerator),
+                                      decimal.Decimal(value.denominator))
+    return decimal.Decimal(value)
+
+
+def _decimal_power(x, y):
+    """Compute x ** y with DECIMAL_CONTEXT, raising ValueError on overflow."""
+    try:
+        return DECIMAL_CONTEXT.power(_to_decimal(x), decimal.Decimal(y))
+    except decimal.Overflow:
+        raise ValueError("Result too large to compute") from None
+
+
+def exact_power(x, y):
+    """Compute x ** y without floats.
+
+    Integer exponents give an exact int or Fraction unless the result would
+    exceed MAX_EXACT_DIGITS; those and other exponents use Decimal
+    arithmetic with DECIMAL_CONTEXT precision.
+    """
+    if _is_integral(y):
+        exponent = int(y)
+        base = int(x) if _is_integral(x) else Fraction(x)
+        if exponent < 0 and base == 0:
+            raise ValueError("Cannot raise zero to a negative power")
+        if _exact_bits(base, exponent) > _MAX_EXACT_BITS:
+            # Too long to build exactly in reasonable time
+            return _decimal_power(base, exponent)
+        if exponent >= 0:
+            return _printable(power_by_squaring(base, exponent))
+        return _printable(Fraction(1) / power_by_squaring(base, -exponent))
+    if x < 0:
+        raise ValueError("Result is not a real number")
+    return _decimal_power(x, y)
+
+
+def adaptive_power(x, y):
+    """Compute x ** y with floats, escalating only on overflow or precision loss."""
+    try:
+        result = float(x) ** float(y)
+    except OverflowError:
+        return exact_power(x, y)
+    except ZeroDivisionError:
+        raise ValueError("Cannot raise zero to a negative power")
+    if isinstance(result, complex):
+        return result
+    if abs(result) > EXACT_FLOAT_INTEGER_LIMIT and _is_integral(x) and _is_integral(y) and y > 0:
+        return exact_power(x, y)  # The float is only an approximation of the integer
+    if abs(result) < sys.float_info.min and x != 0:
+        exact = exact_power(x, y)
+        if exact != result:  # Underflowed to zero or lost precision as a subnormal
+            return exact
+    return result
+
+
+def _decimal_exponential(x):
+    """Compute e^x with DECIMAL_CONTEXT, raising ValueError on overflow."""
+    try:
+        return DECIMAL_CONTEXT.exp(_to_decimal(x))
+    except decimal.Overflow:
+        raise ValueError("Result too large to compute") from None
+
+
+def adaptive_exponential(x):
+    """Compute e^x with floats, escalating to Decimal on overflow or underflow."""
+    try:
+        result = math.exp(x)
+    except OverflowError:
+        return _decimal_exponential(x)
+    if result < sys.float_info.min:
+        return _decimal_exponential(x)
+    return result
 
 
 class Calculator:
-    """Advanced calculator class with scientific functions and error handling."""
+    """Advanced calculator class with scientific functions and error handling.
+
+    A Calculator may be shared between threads. History is recorded into
+    per-thread shards (see ShardedHistory), and the caches and history log
+    tolerate concurrent use. Memoization and instrumentation counters may
+    slightly undercount under heavy contention. Enable memoization or
+    instrumentation before sharing the instance.
+    """
     
-    def __init__(self):
-        """Initialize the calculator."""
-        self.history = []  # Store calculation history
+    def __init__(self, history_size=1000, log_path=None, cache_size=None,
+                 instrument=False, precision="float", approximate=None):
+        """Initialize the calculator, keeping at most history_size records.
+
+        If log_path is given, every recorded calculation is also appended
+        to a persistent HistoryLog at that path. If cache_size is given,
+        scientific functions are memoized (see enable_memoization). If
+        instrument is true, operations are measured (see
+        enable_instrumentation). precision is "float" or "adaptive"; in
+        adaptive mode power and exponential return exact or Decimal
+        results instead of failing on overflow. If approximate is given,
+        batch sine and cosine use ApproximateMath with that maximum error.
+        """
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision mode: {precision}")
+        self.precision = precision
+        self.history = ShardedHistory(history_size)  # Thread-safe calculation history
+        self.log = HistoryLog(log_path) if log_path else None
+        self.memo = None
+        self.metrics = None
+        if cache_size:
+            self.enable_memoization(cache_size)
+        if instrument:
+            self.enable_instrumentation()
+        approximation = ApproximateMath(approximate) if approximate else None
+        self.batch = BatchCalculator(approximation)  # Vectorized versions of every operation
+        self.compiler = ExpressionCompiler()  # Compiled-expression cache
+        self.checked = CheckedCalculator(self)  # Non-raising (result, status) API
     
     def add(self, x, y):
         """Addition operation."""
@@ -43,11 +1115,28 @@ class Calculator:
     
     def power(self, x, y):
         """Power operation (x^y)."""
+        if self.precision == "adaptive":
+            return adaptive_power(x, y)
         try:
-            return x ** y
+            return float(x) ** y
         except OverflowError:
             raise ValueError("Result too large to compute")
     
+    def modular_power(self, base, exponent, modulus):
+        """Modular power (base^exponent mod modulus) for integer operands."""
+        if not all(_is_integral(v) for v in (base, exponent, modulus)):
+            raise ValueError("Modular power requires integer operands")
+        base, exponent, modulus = int(base), int(exponent), int(modulus)
+        if modulus == 0:
+            raise ValueError("Cannot perform modulo with zero")
+        if exponent < 0:
+            try:
+                base = pow(base, -1, modulus)
+            except ValueError:
+                raise ValueError("Base has no inverse for this modulus")
+            exponent = -exponent
+        return power_by_squaring(base, exponent, modulus)
+    
     def modulo(self, x, y):
         """Modulo operation with zero division handling."""
         if y == 0:
@@ -86,6 +1175,8 @@ class Calculator:
     
     def exponential(self, x):
         """Exponential function (e^x)."""
+        if self.precision == "adaptive":
+            return adaptive_exponential(x)
         try:
             return math.exp(x)
         except OverflowError:
@@ -99,9 +1190,104 @@ class Calculator:
         """Convert radians to degrees."""
         return math.degrees(radians)
     
+    def __getattr__(self, name):
+        """Expose registered third-party operations as methods."""
+        operation = OPERATIONS.get(name)
+        if operation is None or operation.func is None:
+            raise AttributeError(f"'Calculator' object has no attribute '{name}'")
+        return operation.checked
+    
+    def calculate(self, name, *operands):
+        """Perform the registered operation called name on operands."""
+        arity = get_operation(name).arity
+        if len(operands) != arity:
+            raise ValueError(f"{name} takes {arity} operand(s)")
+        return getattr(self, name)(*operands)
+    
+    def enable_memoization(self, cache_size=1024):
+        """Memoize the scientific functions in a shared LRU cache.
+
+        Results and raised domain errors are both cached. Hit, miss and
+        eviction counts are available from self.memo.info().
+        """
+        self.memo = MemoCache(cache_size)
+        self._install_wrappers()
+    
+    def disable_memoization(self):
+        """Remove the memoization layer, restoring the plain methods."""
+        self.memo = None
+        self._install_wrappers()
+    
+    def enable_instrumentation(self, buckets=LATENCY_BUCKETS):
+        """Record call counts, error counts and latency for every operation.
+
+        Metrics are available from self.metrics and can be exported with
+        self.metrics.write(path). While disabled, operations are the plain
+        methods and cost nothing extra.
+        """
+        self.metrics = Metrics(buckets)
+        self._install_wrappers()
+    
+    def disable_instrumentation(self):
+        """Remove the instrumentation layer."""
+        self.metrics = None
+        self._install_wrappers()
+    
+    def _install_wrappers(self):
+        """Rebuild per-instance operation wrappers from the enabled layers.
+
+        Memoization wraps the plain method and instrumentation wraps the
+        result, so metrics reflect what callers actually experience.
+        """
+        for name in OPERATION_NAMES:
+            self.__dict__.pop(name, None)
+            method = plain = getattr(self, name)
+            if self.memo is not None and name in MEMOIZED_OPERATIONS:
+                method = self.memo.wrap(name, method)
+            if self.metrics is not None:
+                method = self.metrics.wrap(name, method)
+            if method is not plain:
+                setattr(self, name, method)
+        self.checked = CheckedCalculator(self)  # Rebuilt around the new wrappers
+    
+    def statistics(self, values):
+        """Sum, mean, variance, min and max of values in one pass (see RunningStats)."""
+        return RunningStats(values)
+    
+    def evaluate(self, expression, **variables):
+        """Evaluate an expression string such as "sqrt(x**2 + y**2)".
+
+        The expression is compiled once and cached, so re-evaluating it
+        with new variable bindings skips parsing entirely.
+        """
+        compiled = self.compiler.compile(expression)
+        try:
+            return compiled(self, **variables)
+        except TypeError:  # E.g. sqrt of the complex result of (-8) ** 0.5
+            raise ValueError("Operands must be real numbers") from None
+        except decimal.Overflow:  # Adaptive Decimal results combined past Emax
+            raise ValueError("Result too large to compute") from None
+        except RecursionError:  # Compiled, but too deep to evaluate
+            raise ValueError("Expression too deeply nested") from None
+    
     def add_to_history(self, operation, result):
         """Add calculation to history."""
-        self.history.append(f"{operation} = {result}")
+        self.history.append_text(operation, result)
+    
+    def record(self, name, result, *operands):
+        """Add a calculation to history as a compact record."""
+        self.history.append(name, result, *operands)
+        if self.log is not None and _fits_float_record(result):
+            self.log.append(name, result, *operands)
+    
+    def close(self):
+        """Flush and close the persistent history log, if any."""
+        if self.log is not None:
+            self.log.close()
+    
+    def export_history(self, path):
+        """Write the history to path as result columns (see save_columns)."""
+        save_columns(path, self.history.columns())
     
     def show_history(self):
         """Display calculation history."""
@@ -120,219 +1306,2044 @@ class Calculator:
         print("History cleared.")
 
 
-def get_number(prompt):
-    """Get a valid number from user input with error handling."""
-    while True:
-        try:
-            value = input(prompt)
-            if value.lower() == 'q':
-                return None
-            return float(value)
-        except ValueError:
-            print("Invalid input. Please enter a valid number or 'q' to quit.")
+class BatchResult:
+    """Result of a vectorized operation: values plus a per-element error mask."""
 
+    def __init__(self, values, errors, message=None):
+        """Store result values (NaN where invalid), error mask and the message
+        of the first failure, which is None when no element failed."""
+        self.values = values
+        self.errors = errors
+        self.message = message
 
-def get_two_numbers():
-    """Get two numbers from user input."""
-    x = get_number("Enter first number (or 'q' to quit): ")
-    if x is None:
-        return None, None
-    
-    y = get_number("Enter second number (or 'q' to quit): ")
-    if y is None:
-        return None, None
-    
-    return x, y
+    @property
+    def ok(self):
+        """True if no element hit a domain error."""
+        return not self.errors.any()
 
+    def __len__(self):
+        return self.values.size
 
-def get_one_number():
-    """Get one number from user input."""
-    return get_number("Enter number (or 'q' to quit): ")
 
+def _as_array(x):
+    """Convert a scalar, sequence or array to a float64 NumPy array."""
+    return np.asarray(x, dtype=np.float64)
 
-def display_menu():
-    """Display the main calculator menu."""
-    print("\n" + "="*50)
-    print("       ADVANCED PYTHON CALCULATOR")
-    print("="*50)
-    print("Basic Operations:")
-    print("  1. Addition (+)")
-    print("  2. Subtraction (-)")
-    print("  3. Multiplication (*)")
-    print("  4. Division (/)")
-    print("  5. Power (**)")
-    print("  6. Modulo (%)")
-    print("\nScientific Functions:")
-    print("  7. Square Root")
-    print("  8. Sine (radians)")
-    print("  9. Cosine (radians)")
-    print(" 10. Tangent (radians)")
-    print(" 11. Natural Logarithm (ln)")
-    print(" 12. Logarithm Base 10")
-    print(" 13. Exponential (e^x)")
-    print("\nAngle Conversion:")
-    print(" 14. Degrees to Radians")
-    print(" 15. Radians to Degrees")
-    print("\nUtilities:")
-    print(" 16. Show History")
-    print(" 17. Clear History")
-    print(" 18. Quit")
-    print("="*50)
 
+def _overflowed(result, *args):
+    """Mask of elements that became infinite from finite inputs."""
+    finite = np.logical_and.reduce([np.isfinite(a) for a in args])
+    return np.isinf(result) & finite
 
-def main():
-    """Main calculator function with interactive menu."""
-    calc = Calculator()
-    
-    print("Welcome to the Advanced Python Calculator!")
-    print("This calculator supports floating-point arithmetic and scientific functions.")
-    print("You can quit any operation by entering 'q'.")
-    
-    while True:
-        display_menu()
-        
+
+def _apply_elementwise(func, columns, shape, skip):
+    """Apply a scalar function per element, for operations without a kernel.
+
+    Returns the values, a mask of elements that raised and the first error
+    message. Elements where skip is true are left as NaN.
+    """
+    columns = np.broadcast_arrays(*columns)
+    values = np.full(shape, np.nan)
+    errors = np.zeros(shape, dtype=bool)
+    message = None
+    for index in np.ndindex(shape):
+        if skip[index]:
+            continue
         try:
-            choice = input("\nSelect an operation (1-18): ").strip()
-            
-            if choice == '18' or choice.lower() == 'q':
-                print("Thank you for using the Advanced Python Calculator!")
-                sys.exit(0)
-            
-            elif choice == '1':  # Addition
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.add(x, y)
-                operation = f"{x} + {y}"
-                
-            elif choice == '2':  # Subtraction
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.subtract(x, y)
-                operation = f"{x} - {y}"
-                
-            elif choice == '3':  # Multiplication
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.multiply(x, y)
-                operation = f"{x} * {y}"
-                
-            elif choice == '4':  # Division
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.divide(x, y)
-                operation = f"{x} / {y}"
-                
-            elif choice == '5':  # Power
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.power(x, y)
-                operation = f"{x} ** {y}"
-                
-            elif choice == '6':  # Modulo
-                x, y = get_two_numbers()
-                if x is None or y is None:
-                    continue
-                result = calc.modulo(x, y)
-                operation = f"{x} % {y}"
-                
-            elif choice == '7':  # Square Root
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.square_root(x)
-                operation = f"sqrt({x})"
-                
-            elif choice == '8':  # Sine
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.sine(x)
-                operation = f"sin({x})"
-                
-            elif choice == '9':  # Cosine
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.cosine(x)
-                operation = f"cos({x})"
-                
-            elif choice == '10':  # Tangent
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.tangent(x)
-                operation = f"tan({x})"
-                
-            elif choice == '11':  # Natural Log
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.natural_log(x)
-                operation = f"ln({x})"
-                
-            elif choice == '12':  # Log Base 10
-                x = get_one_number()
-                if x is None:
-                    continue
-                result = calc.log_base_10(x)
-                operation = f"log10({x})"
+            values[index] = func(*(float(column[index]) for column in columns))
+        except OverflowError:
+            errors[index] = True
+            message = message or "Result too large to compute"
+        except (ValueError, ArithmeticError) as e:
+            errors[index] = True
+            message = message or str(e)
+    return values, errors, message
+
+
+# Approximate mode: the bound for sine and cosine only holds up to this
+# magnitude; larger (and non-finite) arguments use the exact functions
+APPROX_TRIG_LIMIT = 1e6
+APPROX_BLOCK_SIZE = 16384  # Elements per cache-resident block
+
+
+def _table_size(span, max_error, curvature):
+    """Smallest power-of-two table size for which linear interpolation over
+    span stays within max_error, given max |f''| = curvature.
+
+    Linear interpolation with spacing h has error at most h**2 / 8 * curvature.
+    """
+    h = math.sqrt(8 * max_error / curvature)
+    return 1 << max(1, math.ceil(math.log2(span / h)))
+
+
+class ApproximateMath:
+    """Fast table-driven approximations of sine and cosine for batch mode.
+
+    Values are linearly interpolated from a precomputed table of one sine
+    period, sized so the absolute error is at most max_error (for |x| up
+    to APPROX_TRIG_LIMIT; larger arguments are computed exactly). Input is
+    processed in cache-sized blocks with reused temporaries.
+
+    Only sine and cosine are approximated: NumPy's vectorized tangent,
+    natural_log, log_base_10 and exponential already measured faster than a
+    table lookup, so those stay exact. Use verify_approximation() to
+    measure the real error against math.
+    """
+
+    def __init__(self, max_error=1e-6):
+        """Precompute the sine table for the requested maximum error."""
+        if not 0 < max_error < 0.1:
+            raise ValueError("max_error must be between 0 and 0.1")
+        self.max_error = max_error
+        self._size = _table_size(2 * math.pi, max_error, 1)  # |sin''| <= 1
+        self._scale = self._size / (2 * math.pi)  # Radians to table steps
+        samples = np.sin(np.linspace(0, 2 * math.pi, self._size + 1))
+        self._values = samples[:-1].copy()
+        self._slopes = np.diff(samples)
+        self.kernels = {"sine": self.sine, "cosine": self.cosine}
+
+    def _lookup(self, x, offset, exact):
+        """Interpolate the table at x * scale + offset, block by block."""
+        x = _as_array(x)
+        flat = x.ravel()
+        out = np.empty(flat.size)
+        block = min(APPROX_BLOCK_SIZE, flat.size)
+        position = np.empty(block)
+        floor = np.empty(block)
+        index = np.empty(block, dtype=np.int64)
+        scratch = np.empty(block)
+        mask = self._size - 1
+
+        with np.errstate(invalid='ignore'):
+            for start in range(0, flat.size, APPROX_BLOCK_SIZE):
+                chunk = flat[start:start + APPROX_BLOCK_SIZE]
+                n = chunk.size
+                p, f, i, t = position[:n], floor[:n], index[:n], scratch[:n]
+                o = out[start:start + n]
+                np.multiply(chunk, self._scale, out=p)
+                p += offset
+                np.floor(p, out=f)
+                p -= f  # Fraction of the way to the next table entry
+                np.copyto(i, f, casting='unsafe')
+                i &= mask  # Wrap to one period
+                np.take(self._slopes, i, out=o)
+                o *= p
+                np.take(self._values, i, out=t)
+                o += t
+
+        # Huge, infinite or NaN arguments are computed exactly
+        if flat.size and not (-APPROX_TRIG_LIMIT <= flat.min() and flat.max() <= APPROX_TRIG_LIMIT):
+            outside = ~(np.abs(flat) <= APPROX_TRIG_LIMIT)
+            with np.errstate(all='ignore'):
+                out[outside] = exact(flat[outside])
+        return out.reshape(x.shape)
+
+    def sine(self, x):
+        """Approximate sine (radians)."""
+        return self._lookup(x, 0.0, np.sin)
+
+    def cosine(self, x):
+        """Approximate cosine (radians), as sine shifted by a quarter period."""
+        return self._lookup(x, self._size / 4, np.cos)
+
+
+def verify_approximation(approximation, samples=200_000, seed=0):
+    """Measure the real absolute error of an ApproximateMath against math.
+
+    Each function is sampled densely over one period on either side of zero
+    and randomly over its whole bounded domain, plus non-finite values.
+    Returns {name: {"max_error", "bound", "ok"}}.
+    """
+    rng = np.random.default_rng(seed)
+    half = samples // 2
+    xs = np.concatenate([
+        np.linspace(-2 * math.pi, 2 * math.pi, half),
+        rng.uniform(-APPROX_TRIG_LIMIT, APPROX_TRIG_LIMIT, samples - half),
+        [APPROX_TRIG_LIMIT * 10, -math.inf, math.nan],
+    ])
+
+    report = {}
+    for name, func in (("sine", math.sin), ("cosine", math.cos)):
+        exact = np.array([func(x) if math.isfinite(x) else math.nan for x in xs.tolist()])
+        approx = approximation.kernels[name](xs)
+        if not np.array_equal(np.isnan(approx), np.isnan(exact)):
+            error = math.inf
+        else:
+            error = float(np.nanmax(np.abs(approx - exact)))
+        report[name] = {
+            "max_error": error,
+            "bound": approximation.max_error,
+            "ok": error <= approximation.max_error,
+        }
+    return report
+
+
+class BatchCalculator:
+    """Vectorized calculator: each operation runs in one pass over whole arrays.
+
+    Mirrors the Calculator API (batch.divide(x, y) is batch.apply("divide",
+    x, y)) but accepts scalars, sequences or NumPy arrays, broadcast against
+    each other, and returns a BatchResult. Domain errors are reported
+    through the per-element error mask instead of raising.
+    """
+
+    def __init__(self, approximation=None):
+        """Optionally use an ApproximateMath's kernels where it has them."""
+        self.approximation = approximation
+
+    def apply(self, name, *operands):
+        """Evaluate the registered operation name over whole arrays."""
+        operation = get_operation(name)
+        if len(operands) != operation.arity:
+            raise ValueError(f"{name} takes {operation.arity} operand(s)")
+        columns = [_as_array(operand) for operand in operands]
+        shape = np.broadcast_shapes(*(column.shape for column in columns))
+
+        # Domain checks; the message is that of the first check that fired
+        errors = np.zeros(shape, dtype=bool)
+        fired = None
+        for predicate, message in operation.checks:
+            failed = np.broadcast_to(predicate(*columns), shape)
+            if fired is None and failed.any():
+                fired = message
+            errors = errors | failed
+
+        kernel = operation.kernel
+        if self.approximation is not None:
+            kernel = self.approximation.kernels.get(name, kernel)
+
+        if kernel is None:
+            values, failed, failure = _apply_elementwise(operation.func, columns, shape, errors)
+            fired = fired or failure
+            errors = errors | failed
+        else:
+            with np.errstate(all='ignore'):
+                values = np.array(np.broadcast_to(kernel(*columns), shape),
+                                  dtype=np.float64)
+            if operation.overflow:
+                failed = _overflowed(values, *columns) & ~errors
+                if fired is None and failed.any():
+                    fired = "Result too large to compute"
+                errors = errors | failed
+
+        values[errors] = np.nan
+        return BatchResult(values, errors, fired)
+
+    def __getattr__(self, name):
+        if name not in OPERATIONS:
+            raise AttributeError(f"'BatchCalculator' object has no attribute '{name}'")
+        return lambda *operands: self.apply(name, *operands)
+
+
+class CheckedCalculator:
+    """Non-raising scalar API: each operation returns (result, status).
+
+    Mirrors the Calculator API (checked.divide(x, y) is checked.apply(
+    "divide", x, y)), but instead of raising ValueError it returns NaN and
+    a status code: STATUS_OK, STATUS_OVERFLOW, STATUS_FAILED or the code of
+    the domain check that failed. STATUS_MESSAGES[status] is the message
+    the raising method would have used. Domain checks run before the
+    operation, so invalid inputs never raise and catch an exception.
+    """
+
+    def __init__(self, calc):
+        """Evaluate through calc's methods, including any installed wrappers."""
+        self.calc = calc
+
+    def apply(self, name, *operands):
+        """Perform the registered operation name; return (result, status)."""
+        operation = get_operation(name)
+        if len(operands) != operation.arity:
+            raise ValueError(f"{name} takes {operation.arity} operand(s)")
+        return getattr(self, name)(*operands)
+
+    def _build(self, operation):
+        """Make a function running operation's checks, then the operation."""
+        method = getattr(self.calc, operation.name)
+        checks = tuple((predicate, STATUS_CODES[message])
+                       for predicate, message in operation.checks)
+        nan = math.nan
+
+        def checked(*operands):
+            for predicate, status in checks:
+                if predicate(*operands):
+                    return nan, status
+            try:
+                return method(*operands), STATUS_OK
+            except ValueError as e:  # Overflow, or a cached or unanticipated error
+                return nan, STATUS_CODES.get(str(e), STATUS_FAILED)
+            except OverflowError:
+                return nan, STATUS_OVERFLOW
+            except ArithmeticError:
+                return nan, STATUS_FAILED
+
+        checked.__name__ = operation.name
+        return checked
+
+    def __getattr__(self, name):
+        if name not in OPERATIONS:
+            raise AttributeError(f"'CheckedCalculator' object has no attribute '{name}'")
+        checked = self._build(OPERATIONS[name])
+        setattr(self, name, checked)  # Later lookups skip __getattr__
+        return checked
+
+
+def _zero_divisor(x, y):
+    return y == 0
+
+
+def _negative(x):
+    return x < 0
+
+
+def _non_positive(x):
+    return x <= 0
+
+
+# Built-in operations, in menu order
+register_operation(Operation(
+    "add", 2, "+", "Addition (+)", "Basic Operations", kernel="add"))
+register_operation(Operation(
+    "subtract", 2, "-", "Subtraction (-)", "Basic Operations", kernel="subtract"))
+register_operation(Operation(
+    "multiply", 2, "*", "Multiplication (*)", "Basic Operations", kernel="multiply"))
+register_operation(Operation(
+    "divide", 2, "/", "Division (/)", "Basic Operations", kernel="divide",
+    checks=[(_zero_divisor, "Cannot divide by zero")]))
+register_operation(Operation(
+    "power", 2, "**", "Power (**)", "Basic Operations", kernel="power", overflow=True))
+register_operation(Operation(
+    "modulo", 2, "%", "Modulo (%)", "Basic Operations", kernel="mod",
+    checks=[(_zero_divisor, "Cannot perform modulo with zero")]))
+register_operation(Operation(
+    "square_root", 1, "sqrt", "Square Root", "Scientific Functions", kernel="sqrt",
+    checks=[(_negative, "Cannot calculate square root of negative number")]))
+register_operation(Operation(
+    "sine", 1, "sin", "Sine (radians)", "Scientific Functions", kernel="sin"))
+register_operation(Operation(
+    "cosine", 1, "cos", "Cosine (radians)", "Scientific Functions", kernel="cos"))
+register_operation(Operation(
+    "tangent", 1, "tan", "Tangent (radians)", "Scientific Functions", kernel="tan"))
+register_operation(Operation(
+    "natural_log", 1, "ln", "Natural Logarithm (ln)", "Scientific Functions", kernel="log",
+    checks=[(_non_positive, "Logarithm undefined for non-positive numbers")],
+    aliases=["log"]))
+register_operation(Operation(
+    "log_base_10", 1, "log10", "Logarithm Base 10", "Scientific Functions", kernel="log10",
+    checks=[(_non_positive, "Logarithm undefined for non-positive numbers")]))
+register_operation(Operation(
+    "exponential", 1, "exp", "Exponential (e^x)", "Scientific Functions", kernel="exp",
+    overflow=True))
+register_operation(Operation(
+    "degrees_to_radians", 1, "radians", "Degrees to Radians", "Angle Conversion",
+    kernel="radians", format="{x}° to radians"))
+register_operation(Operation(
+    "radians_to_degrees", 1, "degrees", "Radians to Degrees", "Angle Conversion",
+    kernel="degrees", format="{x} radians to degrees"))
+
+
+STATS_CHUNK_SIZE = 65536  # Values per vectorized chunk when streaming statistics
+
+
+class RunningStats:
+    """One-pass streaming statistics in constant memory.
+
+    Tracks count, sum (Neumaier-compensated), mean and variance (Welford),
+    and running min/max. Partial results, for example from parallel
+    chunks, are combined exactly with merge().
+    """
+
+    def __init__(self, values=()):
+        """Start empty, then add any initial values."""
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0  # Sum of squared deviations from the mean
+        self._sum = 0.0
+        self._compensation = 0.0  # Low-order bits lost from _sum
+        self.update_many(values)
+
+    def _add_to_sum(self, value):
+        """Neumaier summation step."""
+        total = self._sum + value
+        if abs(self._sum) >= abs(value):
+            self._compensation += (self._sum - total) + value
+        else:
+            self._compensation += (value - total) + self._sum
+        self._sum = total
+
+    def update(self, value):
+        """Add one value."""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self._add_to_sum(value)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def update_many(self, values):
+        """Add every value from an iterable or array, one chunk at a time."""
+        if isinstance(values, np.ndarray):
+            flat = values.reshape(-1)
+            for start in range(0, flat.size, STATS_CHUNK_SIZE):
+                self._update_chunk(np.asarray(flat[start:start + STATS_CHUNK_SIZE], dtype=np.float64))
+            return
+        values = iter(values)
+        while True:
+            chunk = np.fromiter(islice(values, STATS_CHUNK_SIZE), dtype=np.float64)
+            if not chunk.size:
+                break
+            self._update_chunk(chunk)
+
+    def _update_chunk(self, chunk):
+        """Fold a chunk's statistics into the running totals."""
+        if not chunk.size:
+            return
+        partial = RunningStats()
+        partial.count = chunk.size
+        partial.mean = float(chunk.mean())
+        partial._m2 = float(np.square(chunk - partial.mean).sum())
+        partial._sum = math.fsum(chunk.tolist())
+        partial.min = float(chunk.min())
+        partial.max = float(chunk.max())
+        self.merge(partial)
+
+    def merge(self, other):
+        """Combine another RunningStats into this one; returns self."""
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self._add_to_sum(other._sum)
+        self._add_to_sum(other._compensation)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def combine(cls, parts):
+        """Merge an iterable of partial RunningStats into a new one."""
+        total = cls()
+        for part in parts:
+            total.merge(part)
+        return total
+
+    @property
+    def sum(self):
+        """Compensated sum of all values."""
+        return self._sum + self._compensation
+
+    @property
+    def variance(self):
+        """Population variance (NaN when empty)."""
+        return self._m2 / self.count if self.count else math.nan
+
+    @property
+    def sample_variance(self):
+        """Sample variance with Bessel's correction (NaN for fewer than 2 values)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        """Population standard deviation."""
+        return math.sqrt(self.variance)
+
+    def summary(self):
+        """Return the statistics as a dict."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.mean if self.count else math.nan,
+            "variance": self.variance,
+            "std": self.std,
+            "min": self.min if self.count else math.nan,
+            "max": self.max if self.count else math.nan,
+        }
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean}, variance={self.variance})"
+
+
+# Named constants usable in expressions
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+def parse_expression(text):
+    """Parse expression text into an AST node, raising ValueError on bad syntax."""
+    try:
+        return ast.parse(text.strip(), mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"Invalid expression: {text}")
+    except RecursionError:
+        raise ValueError("Expression too deeply nested") from None
+
+
+class CompiledExpression:
+    """An expression parsed once into a tree of Calculator calls."""
+
+    def __init__(self, text, evaluator, variables):
+        """Store the source text, evaluator closure and variable names."""
+        self.text = text
+        self.variables = variables
+        self._evaluator = evaluator
+
+    def __call__(self, calc, **variables):
+        """Evaluate with the given Calculator and variable bindings."""
+        missing = self.variables.difference(variables)
+        if missing:
+            raise ValueError(f"Undefined variable: {sorted(missing)[0]}")
+        return self._evaluator(calc, variables)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.text!r})"
+
+
+class ExpressionCompiler:
+    """Compile expression strings into Calculator calls with an LRU cache."""
+
+    def __init__(self, maxsize=128):
+        """Initialize an empty cache holding at most maxsize expressions."""
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def compile(self, text):
+        """Return the compiled form of text, parsing it only on a cache miss."""
+        compiled = self._cache.get(text)
+        if compiled is not None:
+            try:
+                self._cache.move_to_end(text)
+            except KeyError:  # Evicted by another thread meanwhile
+                pass
+            return compiled
+
+        variables = set()
+        try:
+            evaluator = self._compile_node(parse_expression(text), variables)
+        except RecursionError:
+            raise ValueError("Expression too deeply nested") from None
+        compiled = CompiledExpression(text, evaluator, frozenset(variables))
+
+        self._cache[text] = compiled
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        """Drop every cached expression."""
+        self._cache.clear()
+
+    def _compile_node(self, node, variables):
+        """Turn one AST node into a closure taking (calc, variables)."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            value = node.value
+            return lambda calc, env: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in CONSTANTS:
+                value = CONSTANTS[name]
+                return lambda calc, env: value
+            variables.add(name)
+            return lambda calc, env: env[name]
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile_node(node.operand, variables)
+            if isinstance(node.op, ast.USub):
+                return lambda calc, env: -operand(calc, env)
+            return operand
+
+        if isinstance(node, ast.BinOp) and OPERATOR_SYMBOLS.get(type(node.op)) in EXPRESSION_NAMES:
+            method = EXPRESSION_NAMES[OPERATOR_SYMBOLS[type(node.op)]]
+            left = self._compile_node(node.left, variables)
+            right = self._compile_node(node.right, variables)
+            return lambda calc, env: getattr(calc, method)(left(calc, env), right(calc, env))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            method = EXPRESSION_NAMES.get(node.func.id)
+            if method is None:
+                raise ValueError(f"Unsupported function: {node.func.id}")
+            arity = OPERATIONS[method].arity
+            if len(node.args) != arity or node.keywords:
+                raise ValueError(f"{node.func.id}() takes {arity} argument(s)")
+            arguments = [self._compile_node(arg, variables) for arg in node.args]
+            if arity == 1:
+                [argument] = arguments
+                return lambda calc, env: getattr(calc, method)(argument(calc, env))
+            first, second = arguments
+            return lambda calc, env: getattr(calc, method)(first(calc, env), second(calc, env))
+        raise ValueError(f"Unsupported syntax in expression: {ast.unparse(node)}")
+
+
+class GraphNode:
+    """One node of an ExpressionGraph: an input, a constant or an operation."""
+
+    __slots__ = ("kind", "name", "children", "dependents", "value", "error", "dirty")
+
+    def __init__(self, kind, name=None, children=(), value=None):
+        self.kind = kind  # "input", "constant", "negate" or "operation"
+        self.name = name  # Variable or operation name
+        self.children = children
+        self.dependents = []
+        self.value = value
+        self.error = None
+        self.dirty = kind != "constant"
+
+    def __repr__(self):
+        return f"GraphNode({self.kind!r}, {self.name!r})"
+
+
+class ExpressionGraph:
+    """Lazy expression DAG with common-subexpression elimination.
+
+    Formulas are parsed into shared nodes: identical subexpressions, such
+    as sin(x) used in two formulas, become one node. Node values are
+    cached. Setting an input only marks the nodes that depend on it as
+    dirty, and reading a formula recomputes just those, spreadsheet style.
+    """
+
+    def __init__(self, calc=None):
+        """Create an empty graph evaluating through calc."""
+        self.calc = Calculator() if calc is None else calc
+        self.formulas = {}  # Formula name -> node
+        self.inputs = {}  # Variable name -> node
+        self.evaluations = 0  # Operation nodes computed so far
+        self._nodes = {}  # Structural key -> node, for deduplication
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def define(self, name, text):
+        """Add a formula; names of earlier formulas may be used as variables."""
+        if name in self.formulas or name in self.inputs:
+            raise ValueError(f"Name already in use: {name}")
+        node = self._build(parse_expression(text))
+        self.formulas[name] = node
+        return node
+
+    def _intern(self, key, kind, name=None, children=(), value=None):
+        """Return the node for key, creating it on first use."""
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = GraphNode(kind, name, children, value)
+            for child in children:
+                child.dependents.append(node)
+        return node
+
+    def _build(self, node):
+        """Turn an AST node into (shared) graph nodes."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return self._intern(("constant", node.value, type(node.value)), "constant",
+                                value=node.value)
+
+        if isinstance(node, ast.Name):
+            if node.id in self.formulas:
+                return self.formulas[node.id]
+            if node.id in CONSTANTS:
+                value = CONSTANTS[node.id]
+                return self._intern(("constant", value, float), "constant", value=value)
+            graph_node = self._intern(("input", node.id), "input", node.id)
+            self.inputs[node.id] = graph_node
+            return graph_node
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._build(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return self._intern(("negate", id(operand)), "negate", children=(operand,))
+
+        if isinstance(node, ast.BinOp) and OPERATOR_SYMBOLS.get(type(node.op)) in EXPRESSION_NAMES:
+            name = EXPRESSION_NAMES[OPERATOR_SYMBOLS[type(node.op)]]
+            children = (self._build(node.left), self._build(node.right))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            name = EXPRESSION_NAMES.get(node.func.id)
+            if name is None:
+                raise ValueError(f"Unsupported function: {node.func.id}")
+            arity = OPERATIONS[name].arity
+            if len(node.args) != arity or node.keywords:
+                raise ValueError(f"{node.func.id}() takes {arity} argument(s)")
+            children = tuple(self._build(arg) for arg in node.args)
+        else:
+            raise ValueError(f"Unsupported syntax in expression: {ast.unparse(node)}")
+        key = ("operation", name, *(id(child) for child in children))
+        return self._intern(key, "operation", name, children)
+
+    def set(self, **values):
+        """Set input variables, invalidating only the nodes that depend on them."""
+        for name, value in values.items():
+            node = self.inputs.get(name)
+            if node is None:
+                raise ValueError(f"Unknown input: {name}")
+            if not node.dirty and node.value == value \
+                    and _memo_tag(node.value) == _memo_tag(value):  # Tells -0.0 from 0.0
+                continue
+            node.value = value
+            node.error = None
+            node.dirty = False
+            self._invalidate(node.dependents)
+
+    def _invalidate(self, nodes):
+        """Mark nodes and everything downstream of them dirty."""
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if not node.dirty:  # A dirty node's dependents are already dirty
+                node.dirty = True
+                stack.extend(node.dependents)
+
+    def value(self, name):
+        """Return a formula's value, recomputing only dirty nodes."""
+        if name not in self.formulas:
+            raise ValueError(f"Unknown formula: {name}")
+        return self._evaluate(self.formulas[name])
+
+    def __getitem__(self, name):
+        return self.value(name)
+
+    def _evaluate(self, node):
+        """Return node's value, computing it (and its children) if dirty."""
+        if node.dirty:
+            if node.kind == "input":
+                raise ValueError(f"Undefined variable: {node.name}")
+            node.error = None
+            try:
+                operands = [self._evaluate(child) for child in node.children]
+                if node.kind == "negate":
+                    node.value = -operands[0]
+                else:
+                    self.evaluations += 1
+                    node.value = getattr(self.calc, node.name)(*operands)
+            except ValueError as e:
+                node.error = e
+            except TypeError:  # E.g. sqrt of the complex result of (-8) ** 0.5
+                node.error = ValueError("Operands must be real numbers")
+            node.dirty = False
+        if node.error is not None:
+            raise type(node.error)(*node.error.args)
+        return node.value
+
+
+# Fused pipelines: elements per block. Every intermediate buffer holds one
+# block, so a whole chain's temporaries stay resident in the CPU cache
+PIPELINE_BLOCK_SIZE = 8192
+
+
+class Pipeline:
+    """A chain of operations fused into one cache-blocked pass over arrays.
+
+    Build one from an expression over named variables, such as
+    Pipeline("sqrt(x*x + y*y)"), or from operations applied in turn to one
+    input, such as Pipeline.chain("degrees_to_radians", "sine"). Calling it
+    runs every operation on one block of elements before moving to the
+    next, reusing a fixed set of block-sized buffers: no intermediate
+    result is ever allocated for the whole array, and buffers are recycled
+    as soon as a step's operands are consumed, so peak memory does not grow
+    with the length of the chain.
+
+    Domain checks match BatchCalculator. Errors propagate: an element that
+    fails at any step is NaN and marked in the result's error mask, whose
+    message is that of the earliest failing step.
+    """
+
+    def __init__(self, expression, block_size=PIPELINE_BLOCK_SIZE, approximation=None):
+        """Compile expression into fused steps; see the class docstring."""
+        tree = self._parse(parse_expression(expression)) \
+            if isinstance(expression, str) else expression
+        self.text = expression if isinstance(expression, str) else self._describe(tree)
+        self.block_size = block_size
+        self.approximation = approximation
+        self.variables = []  # Input names, in order of first appearance
+        self._steps = []  # (operation name or None for negation, operand refs, buffer)
+        self._free = []  # Buffers whose value is no longer needed
+        self._buffers = 0
+        self._result = self._compile(tree)
+
+    @classmethod
+    def chain(cls, *steps, **options):
+        """Fuse steps applied in turn to the input x.
+
+        Each step is an operation name, or a tuple (name, operand, ...) whose
+        extra operands are constants following the running value, as in
+        ("power", 2) for squaring.
+        """
+        tree = ("input", "x")
+        for step in steps:
+            name, *constants = (step,) if isinstance(step, str) else step
+            get_operation(name)
+            tree = ("operation", name, tree, *(("constant", float(c)) for c in constants))
+        return cls(tree, **options)
+
+    def _parse(self, node):
+        """Turn an AST node into a (kind, ...) tuple tree."""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return ("constant", float(node.value))
+
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                return ("constant", CONSTANTS[node.id])
+            return ("input", node.id)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._parse(node.operand)
+            return ("negate", operand) if isinstance(node.op, ast.USub) else operand
+
+        if isinstance(node, ast.BinOp) and OPERATOR_SYMBOLS.get(type(node.op)) in EXPRESSION_NAMES:
+            name = EXPRESSION_NAMES[OPERATOR_SYMBOLS[type(node.op)]]
+            return ("operation", name, self._parse(node.left), self._parse(node.right))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            name = EXPRESSION_NAMES.get(node.func.id)
+            if name is None:
+                raise ValueError(f"Unsupported function: {node.func.id}")
+            arity = OPERATIONS[name].arity
+            if len(node.args) != arity or node.keywords:
+                raise ValueError(f"{node.func.id}() takes {arity} argument(s)")
+            return ("operation", name, *(self._parse(arg) for arg in node.args))
+        raise ValueError(f"Unsupported syntax in expression: {ast.unparse(node)}")
+
+    def _describe(self, tree):
+        """Write a tuple tree back as expression text."""
+        kind = tree[0]
+        if kind == "input":
+            return tree[1]
+        if kind == "constant":
+            return repr(tree[1])
+        if kind == "negate":
+            return f"-({self._describe(tree[1])})"
+        operation = OPERATIONS[tree[1]]
+        x, *y = (self._describe(child) for child in tree[2:])
+        return operation.describe(x, *y)
+
+    def _compile(self, tree):
+        """Emit steps for tree; return a reference to where its value lives.
+
+        References are ("input", index), ("constant", value) or ("buffer",
+        index). A step's operand buffers are freed before its output buffer
+        is picked, so the output may overwrite an operand in place.
+        """
+        kind = tree[0]
+        if kind == "constant":
+            return tree
+        if kind == "input":
+            if tree[1] not in self.variables:
+                self.variables.append(tree[1])
+            return ("input", self.variables.index(tree[1]))
+
+        name = None if kind == "negate" else tree[1]
+        operands = [self._compile(child) for child in tree[1 if name is None else 2:]]
+        for kind, index in operands:
+            if kind == "buffer":
+                self._free.append(index)
+        if self._free:
+            buffer = self._free.pop()
+        else:
+            buffer = self._buffers
+            self._buffers += 1
+        self._steps.append((name, operands, buffer))
+        return ("buffer", buffer)
+
+    def __call__(self, *columns, out=None, **variables):
+        """Evaluate over arrays given positionally or by variable name.
+
+        Inputs broadcast against each other like BatchCalculator operands.
+        If out is given (for example a memory-mapped column), results are
+        written into it instead of a new array.
+        """
+        values = dict(zip(self.variables, columns), **variables)
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ValueError(f"Undefined variable: {missing[0]}")
+        inputs = [_as_array(values[name]) for name in self.variables]
+        shape = np.broadcast_shapes(*(column.shape for column in inputs))
+        size = math.prod(shape)
+        inputs = [
+            column.reshape(()) if column.size == 1
+            else np.broadcast_to(column, shape).reshape(-1)  # Copies only if broadcast
+            for column in inputs
+        ]
+
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape or out.dtype != np.float64:
+            raise ValueError(f"out must be a float64 array of shape {shape}")
+        errors = np.zeros(shape, dtype=bool)
+        flat_out, flat_errors = out.reshape(-1), errors.reshape(-1)
+        buffers = [np.empty(min(self.block_size, size)) for _ in range(self._buffers)]
+        fired = None  # Index of the earliest step that failed, and its message
+
+        with np.errstate(all='ignore'):
+            for start in range(0, size, self.block_size):
+                stop = min(start + self.block_size, size)
+                block = [buffer[:stop - start] for buffer in buffers]
+                failed = flat_errors[start:stop]
+
+                def fetch(reference):
+                    kind, value = reference
+                    if kind == "input":
+                        column = inputs[value]
+                        return column if column.ndim == 0 else column[start:stop]
+                    return block[value] if kind == "buffer" else value
+
+                for number, (name, operands, buffer) in enumerate(self._steps):
+                    step_failed, message = self._run_step(
+                        name, [fetch(operand) for operand in operands], block[buffer], failed)
+                    if message is not None and (fired is None or number < fired[0]):
+                        fired = (number, message)
+                    failed |= step_failed
+
+                result = fetch(self._result)
+                flat_out[start:stop] = result
+                flat_out[start:stop][failed] = np.nan
+        return BatchResult(out, errors, fired and fired[1])
+
+    def _run_step(self, name, operands, target, skip):
+        """Compute one step into target; return (new failures, first message)."""
+        if name is None:
+            np.negative(operands[0], out=target)
+            return False, None
+
+        operation = get_operation(name)
+        failed = np.zeros(len(target), dtype=bool)
+        message = None
+        for predicate, check_message in operation.checks:
+            check = predicate(*operands) & ~skip
+            if check.any():
+                failed |= check
+                message = message or check_message
+
+        if operation.overflow:
+            finite = np.isfinite(operands[0])
+            for operand in operands[1:]:
+                finite = finite & np.isfinite(operand)
+
+        kernel = operation.kernel
+        if self.approximation is not None:
+            kernel = self.approximation.kernels.get(name, kernel)
+        if kernel is None:
+            values, raised, failure = _apply_elementwise(
+                operation.func, operands, target.shape, skip | failed)
+            target[:] = values
+            failed |= raised
+            message = message or failure
+        elif isinstance(kernel, np.ufunc):
+            kernel(*operands, out=target)
+        else:
+            target[:] = kernel(*operands)
+
+        if operation.overflow:
+            overflowed = np.isinf(target) & finite & ~skip & ~failed
+            if overflowed.any():
+                failed |= overflowed
+                message = message or "Result too large to compute"
+        target[failed] = np.nan
+        return failed, message
+
+    def __repr__(self):
+        return f"Pipeline({self.text!r})"
+
+
+def function_pipeline(function, **options):
+    """Pipeline for a one-operand operation such as "sine" or its expression
+    name "sin", or an expression in x."""
+    if function.isidentifier():  # A bare name, not an expression like "x + 1"
+        name = EXPRESSION_NAMES.get(function, function)
+        if name in OPERATIONS:
+            return Pipeline.chain(name, **options)
+        if function != "x" and function not in CONSTANTS:
+            raise ValueError(f"Unknown function: {function}")
+    return Pipeline(function, **options)
+
+
+# Vectorized solvers: many independent problems advance together, one
+# array pass per iteration, each with its own convergence mask
+
+SOLVER_TOLERANCE = 1e-12  # Default relative tolerance of the solvers
+NUMERIC_DERIVATIVE_STEP = 2 ** -26  # About sqrt(machine epsilon), relative
+
+
+class SolverResult(BatchResult):
+    """Result of a batch solver: a BatchResult plus convergence data.
+
+    values holds each problem's solution, or the best estimate where the
+    solver ran out of iterations. errors marks problems that failed
+    outright (domain errors, a root that is not bracketed, a zero
+    derivative); their values are NaN. converged marks problems that met
+    the tolerance and iterations counts the passes each one took.
+    """
+
+    def __init__(self, values, errors, message, converged, iterations):
+        """Store the BatchResult fields plus the convergence mask and counts."""
+        super().__init__(values, errors, message)
+        self.converged = converged
+        self.iterations = iterations
+
+    @property
+    def ok(self):
+        """True if every problem converged without an error."""
+        return bool(self.converged.all()) and not self.errors.any()
+
+
+class _Problems:
+    """Flattened problems of a batch solver and the function they share."""
+
+    def __init__(self, function, arrays, parameters):
+        """Broadcast the per-problem arrays and the function's parameters."""
+        self.pipeline = function_pipeline(function)
+        unknown = set(self.pipeline.variables) - {"x"} - set(parameters)
+        if unknown:
+            raise ValueError(f"Undefined variable: {sorted(unknown)[0]}")
+        columns = [_as_array(value) for value in (*arrays, *parameters.values())]
+        self.shape = np.broadcast_shapes(*(column.shape for column in columns))
+        flat = [np.broadcast_to(column, self.shape).ravel() for column in columns]
+        self.arrays = [column.copy() for column in flat[:len(arrays)]]
+        self.parameters = dict(zip(parameters, flat[len(arrays):]))
+        self.size = math.prod(self.shape)
+        self.errors = np.zeros(self.size, dtype=bool)
+        self.converged = np.zeros(self.size, dtype=bool)
+        self.iterations = np.zeros(self.size, dtype=np.int64)
+        self.message = None
+
+    def evaluate(self, x, index):
+        """Evaluate the function at x for the problems numbered index.
+
+        Problems whose evaluation fails are marked as errors; returns the
+        values and the mask of failures.
+        """
+        variables = {name: column[index] for name, column in self.parameters.items()
+                     if name in self.pipeline.variables}
+        if "x" in self.pipeline.variables:
+            variables["x"] = x
+        result = self.pipeline(**variables)
+        values = np.broadcast_to(result.values, np.shape(x))
+        failed = np.broadcast_to(result.errors, np.shape(x))
+        self.fail(index[failed], result.message)
+        return values, failed
+
+    def fail(self, index, message):
+        """Mark the problems numbered index as failed with message."""
+        if len(index):
+            self.errors[index] = True
+            self.message = self.message or message
+
+    def result(self, values):
+        """Build the SolverResult, with NaN for failed problems."""
+        values[self.errors] = np.nan
+        self.converged &= ~self.errors
+        message = self.message
+        if message is None and not self.converged.all():
+            message = "Did not converge"
+        return SolverResult(values.reshape(self.shape), self.errors.reshape(self.shape),
+                            message, self.converged.reshape(self.shape),
+                            self.iterations.reshape(self.shape))
+
+
+def bisect_roots(function, lower, upper, tolerance=SOLVER_TOLERANCE,
+                 max_iterations=200, **parameters):
+    """Find a root of function in [lower, upper] for many problems at once.
+
+    function is an operation name or an expression in x whose other
+    variables are given as keyword arrays, e.g. bisect_roots("x**2 - a",
+    0, 10, a=values). lower, upper and parameters broadcast against each
+    other, one problem per element. Each problem stops once its bracket
+    is narrower than tolerance relative to the root (absolute near zero),
+    or it hits a zero. Returns a SolverResult.
+    """
+    with np.errstate(all='ignore'):
+        problems = _Problems(function, (lower, upper), parameters)
+        low, high = problems.arrays
+        everything = np.arange(problems.size)
+        f_low, _ = problems.evaluate(low, everything)
+        f_high, _ = problems.evaluate(high, everything)
+        f_low, f_high = f_low.copy(), f_high.copy()
+        problems.fail(everything[np.sign(f_low) * np.sign(f_high) > 0],
+                      "Root is not bracketed")
+        high[f_low == 0] = low[f_low == 0]
+        low[f_high == 0] = high[f_high == 0]
+        problems.converged = (low == high) & ~problems.errors
+
+        for _ in range(max_iterations):
+            active = np.flatnonzero(~problems.converged & ~problems.errors)
+            if not len(active):
+                break
+            middle = (low[active] + high[active]) / 2
+            f_middle, failed = problems.evaluate(middle, active)
+            problems.iterations[active] += 1
+            same_side = np.sign(f_middle) == np.sign(f_low[active])
+            moved_low, moved_high = active[same_side], active[~same_side]
+            low[moved_low], f_low[moved_low] = middle[same_side], f_middle[same_side]
+            high[moved_high] = middle[~same_side]
+            exact = f_middle == 0
+            low[active[exact]] = high[active[exact]] = middle[exact]
+            width = high[active] - low[active]
+            problems.converged[active] = ~failed & (
+                exact | (width <= tolerance * np.maximum(np.abs(middle), 1.0)))
+        return problems.result((low + high) / 2)
+
+
+def newton_roots(function, start, derivative=None, tolerance=SOLVER_TOLERANCE,
+                 max_iterations=50, **parameters):
+    """Find a root of function from each start point with Newton's method.
+
+    function and parameters work as for bisect_roots. derivative is an
+    expression for the derivative in the same variables; without one a
+    central difference is used. Each problem stops once its Newton step
+    is below tolerance relative to the root (absolute near zero). Problems
+    with a zero or non-finite derivative fail. Returns a SolverResult.
+    """
+    with np.errstate(all='ignore'):
+        problems = _Problems(function, (start,), parameters)
+        slope = None if derivative is None else _Problems(derivative, (start,), parameters)
+        [x] = problems.arrays
+
+        for _ in range(max_iterations):
+            active = np.flatnonzero(~problems.converged & ~problems.errors)
+            if not len(active):
+                break
+            current = x[active]
+            f_current, failed = problems.evaluate(current, active)
+            if slope is None:
+                step = NUMERIC_DERIVATIVE_STEP * np.maximum(np.abs(current), 1.0)
+                f_right, right_failed = problems.evaluate(current + step, active)
+                f_left, left_failed = problems.evaluate(current - step, active)
+                gradient = (f_right - f_left) / (2 * step)
+                failed = failed | right_failed | left_failed
+            else:
+                gradient, slope_failed = slope.evaluate(current, active)
+                problems.fail(active[slope_failed], slope.message)
+                failed = failed | slope_failed
+            flat = ~failed & ((gradient == 0) | ~np.isfinite(gradient))
+            problems.fail(active[flat], "Zero or non-finite derivative")
+
+            problems.iterations[active] += 1
+            newton_step = f_current / gradient
+            moving = ~failed & ~flat
+            x[active[moving]] = (current - newton_step)[moving]
+            problems.converged[active] = moving & (
+                (f_current == 0)
+                | (np.abs(newton_step) <= tolerance * np.maximum(np.abs(x[active]), 1.0)))
+        return problems.result(x)
+
+
+def integrate(function, lower, upper, tolerance=1e-8, max_depth=40, **parameters):
+    """Integrate function from lower to upper for many problems at once.
+
+    function and parameters work as for bisect_roots. Uses adaptive
+    Simpson quadrature: every pending subinterval of every problem is
+    refined in the same array pass, and a subinterval is split only where
+    its error estimate exceeds its share of the absolute tolerance.
+    Problems that still need refinement after max_depth halvings keep
+    their best estimate but are not marked converged. Returns a
+    SolverResult; iterations counts refinement passes.
+    """
+    with np.errstate(all='ignore'):
+        problems = _Problems(function, (lower, upper), parameters)
+        a, b = problems.arrays
+        index = np.arange(problems.size)
+        m = (a + b) / 2
+        f, _ = problems.evaluate(np.concatenate([a, m, b]), np.tile(index, 3))
+        fa, fm, fb = np.split(f, 3)
+        whole = (b - a) / 6 * (fa + 4 * fm + fb)
+        tol = np.full(problems.size, float(tolerance))
+        depth = 0
+        total = np.zeros(problems.size)
+        problems.converged[:] = True
+
+        while len(index) and depth <= max_depth:
+            keep = ~problems.errors[index]
+            if not keep.all():  # Drop subintervals of problems that failed
+                index, a, b, fa, fm, fb, whole, tol = (
+                    array[keep] for array in (index, a, b, fa, fm, fb, whole, tol))
+            m = (a + b) / 2
+            f, _ = problems.evaluate(np.concatenate([(a + m) / 2, (m + b) / 2]),
+                                     np.tile(index, 2))
+            f_left, f_right = np.split(f, 2)
+            left = (m - a) / 6 * (fa + 4 * f_left + fm)
+            right = (b - m) / 6 * (fm + 4 * f_right + fb)
+            delta = left + right - whole
+            problems.iterations[index] = depth + 1
+
+            done = np.abs(delta) <= 15 * tol
+            if depth == max_depth:
+                problems.converged[index[~done]] = False
+                done[:] = True
+            np.add.at(total, index[done], (left + right + delta / 15)[done])
+
+            split = ~done
+            index = np.tile(index[split], 2)
+            a, b = np.concatenate([a[split], m[split]]), np.concatenate([m[split], b[split]])
+            fa, fb = np.concatenate([fa[split], fm[split]]), np.concatenate([fm[split], fb[split]])
+            fm = np.concatenate([f_left[split], f_right[split]])
+            whole = np.concatenate([left[split], right[split]])
+            tol = np.tile(tol[split] / 2, 2)
+            depth += 1
+        return problems.result(total)
+
+
+def read_expressions(lines):
+    """Yield (line_number, expression) for each non-blank, non-comment line."""
+    for line_number, line in enumerate(lines, 1):
+        expression = line.strip()
+        if expression and not expression.startswith('#'):
+            yield line_number, expression
+
+
+def evaluate_expressions(calc, expressions):
+    """Yield (line_number, expression, result, error) for each expression."""
+    for line_number, expression in expressions:
+        try:
+            yield line_number, expression, calc.evaluate(expression), None
+        except (ValueError, ArithmeticError) as e:
+            yield line_number, expression, None, e
+
+
+def format_results(results):
+    """Yield one output line per evaluated expression."""
+    for line_number, expression, result, error in results:
+        if error is None:
+            yield f"{expression} = {_printable(result)}\n"
+        else:
+            yield f"line {line_number}: {expression}: Error: {error}\n"
+
+
+# Adaptive chunking for parallel evaluation: aim for chunks of roughly
+# TARGET_CHUNK_SECONDS so scheduling overhead stays small but work is balanced
+TARGET_CHUNK_SECONDS = 0.05
+MIN_CHUNK_SIZE = 64
+MAX_CHUNK_SIZE = 65536
+
+_worker_calc = None  # Per-process Calculator used by pool workers
+
+
+def _init_worker(precision):
+    """Create the Calculator used by this worker process."""
+    global _worker_calc
+    _worker_calc = Calculator(history_size=1, precision=precision)
+
+
+def _evaluate_chunk(chunk):
+    """Evaluate (line_number, expression) pairs in a worker process.
+
+    Returns the results and the time taken, which drives chunk auto-tuning.
+    """
+    if _worker_calc is None:
+        _init_worker("float")
+    start = time.perf_counter()
+    results = list(evaluate_expressions(_worker_calc, chunk))
+    return results, time.perf_counter() - start
+
+
+def _tuned_chunk_size(chunk_size, elapsed):
+    """Scale chunk_size so the next chunk takes about TARGET_CHUNK_SECONDS."""
+    if elapsed <= 0:
+        return min(chunk_size * 2, MAX_CHUNK_SIZE)
+    scaled = int(chunk_size * TARGET_CHUNK_SECONDS / elapsed)
+    return max(MIN_CHUNK_SIZE, min(scaled, chunk_size * 2, MAX_CHUNK_SIZE))
+
+
+def parallel_evaluate(expressions, workers=None, chunk_size=None, precision="float"):
+    """Evaluate (line_number, expression) pairs on a process pool.
+
+    Yields the same tuples as evaluate_expressions, in input order. At most
+    two chunks per worker are in flight, so arbitrarily large inputs are
+    streamed. If chunk_size is None it is tuned automatically from how long
+    completed chunks took. Workers use the given precision mode.
+    """
+    workers = workers or os.cpu_count() or 1
+    adaptive = chunk_size is None
+    size = MIN_CHUNK_SIZE if adaptive else chunk_size
+    expressions = iter(expressions)
+
+    with concurrent_futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(precision,)) as pool:
+        pending = deque()
+        while True:
+            chunk = list(islice(expressions, size))
+            if chunk:
+                pending.append((len(chunk), pool.submit(_evaluate_chunk, chunk)))
+            if pending and (not chunk or len(pending) >= workers * 2):
+                count, future = pending.popleft()
+                results, elapsed = future.result()
+                if adaptive:
+                    size = _tuned_chunk_size(count, elapsed)
+                yield from results
+            elif not chunk:
+                break
+
+
+def _batch_chunk(name, *columns):
+    """Apply a BatchCalculator operation to one chunk in a worker process."""
+    result = BatchCalculator().apply(name, *columns)
+    return result.values, result.errors, result.message
+
+
+def auto_chunk_size(total, workers):
+    """Pick a chunk size giving each worker about four chunks of the input."""
+    return max(4096, -(-total // (workers * 4)))
+
+
+def parallel_batch(name, *columns, workers=None, chunk_size=None):
+    """Apply a batch operation to operand columns on a process pool.
+
+    The columns are broadcast together, split into chunks and evaluated in
+    parallel. Returns a BatchResult in input order with a per-element error
+    mask, exactly as the serial BatchCalculator operation would.
+    """
+    workers = workers or os.cpu_count() or 1
+    columns = np.broadcast_arrays(*(_as_array(c).ravel() for c in columns))
+    total = columns[0].size
+    if total == 0:
+        return BatchCalculator().apply(name, *columns)
+    chunk_size = chunk_size or auto_chunk_size(total, workers)
+
+    with concurrent_futures.ProcessPoolExecutor(workers) as pool:
+        futures = [
+            pool.submit(_batch_chunk, name, *(c[i:i + chunk_size] for c in columns))
+            for i in range(0, total, chunk_size)
+        ]
+        parts = [future.result() for future in futures]
+
+    return BatchResult(
+        np.concatenate([values for values, _, _ in parts]),
+        np.concatenate([errors for _, errors, _ in parts]),
+        next((message for _, _, message in parts if message is not None), None),
+    )
+
+
+COLUMN_CHUNK_SIZE = 1 << 20  # Elements per chunk (a multiple of 8 for the bitmap)
+
+
+def open_column(path, mode="r"):
+    """Memory-map a float64 column from a .npy file or a raw little-endian file."""
+    if str(path).endswith(".npy"):
+        column = np.load(path, mmap_mode=mode)
+        if column.dtype != np.float64 or column.ndim != 1:
+            raise ValueError(f"Expected a one-dimensional float64 array: {path}")
+        return column
+    return np.memmap(path, dtype="<f8", mode=mode)
+
+
+def create_column(path, length):
+    """Create a memory-mapped float64 output column (.npy or raw) of length."""
+    if str(path).endswith(".npy"):
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(length,))
+    if length == 0:
+        open(path, "wb").close()  # np.memmap cannot map an empty file
+        return np.empty(0)
+    return np.memmap(path, dtype="<f8", mode="w+", shape=(length,))
+
+
+def create_column_bitmap(path, length):
+    """Create a zeroed, memory-mapped bitmap with one bit per element."""
+    size = (length + 7) // 8
+    if size == 0:
+        open(path, "wb").close()
+        return None
+    return np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+
+
+def read_error_bitmap(path, length):
+    """Load a domain-error bitmap written by process_columns as a bool array."""
+    return np.unpackbits(np.fromfile(path, dtype=np.uint8), count=length).astype(bool)
+
+
+def process_columns(name, operands, output, error_bitmap=None, batch=None,
+                    chunk_size=COLUMN_CHUNK_SIZE):
+    """Apply an operation to memory-mapped float64 columns, chunk by chunk.
+
+    operands are column paths (.npy or raw float64) or plain numbers, which
+    are broadcast. Results go to a memory-mapped output file, so the
+    dataset is never loaded into RAM as a whole. If error_bitmap is given,
+    one bit per element (np.packbits order) marks domain errors; see
+    read_error_bitmap. Returns the number of elements with errors.
+    """
+    if chunk_size % 8:
+        raise ValueError("chunk_size must be a multiple of 8")
+    operation = get_operation(name)
+    if len(operands) != operation.arity:
+        raise ValueError(f"{name} takes {operation.arity} operand(s), got {len(operands)}")
+    batch = BatchCalculator() if batch is None else batch
+    columns = [
+        operand if isinstance(operand, (int, float)) else open_column(operand)
+        for operand in operands
+    ]
+    lengths = {len(column) for column in columns if isinstance(column, np.ndarray)}
+    if len(lengths) != 1:
+        raise ValueError("Operands need exactly one column length")
+    length = lengths.pop()
+
+    out = create_column(output, length)
+    bitmap = None
+    if error_bitmap is not None:
+        bitmap = create_column_bitmap(error_bitmap, length)
+
+    errors = 0
+    for start in range(0, length, chunk_size):
+        stop = min(start + chunk_size, length)
+        chunk = [
+            column[start:stop] if isinstance(column, np.ndarray) else column
+            for column in columns
+        ]
+        result = batch.apply(name, *chunk)
+        out[start:stop] = result.values
+        errors += int(np.count_nonzero(result.errors))
+        if bitmap is not None:
+            bitmap[start // 8:(stop + 7) // 8] = np.packbits(result.errors)
+
+    for mapped in (out, bitmap):
+        if isinstance(mapped, np.memmap):
+            mapped.flush()
+    return errors
+
+
+TABLE_CHUNK_SIZE = 65536  # Grid points per chunk (a multiple of 8 for the bitmap)
+
+
+def table_grid(start, stop, step=None, count=None):
+    """Return (first, spacing, points) of a grid given by step or count.
+
+    With step, the grid is start, start + step, ... up to but excluding
+    stop, like range. With count, it has count evenly spaced points from
+    start to stop inclusive.
+    """
+    if (step is None) == (count is None):
+        raise ValueError("Give exactly one of step and count")
+    if count is not None:
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        return start, (stop - start) / (count - 1) if count > 1 else 0.0, int(count)
+    if step == 0:
+        raise ValueError("step must not be zero")
+    return start, step, max(0, math.ceil((stop - start) / step))
+
+
+def generate_table(function, start, stop, output, step=None, count=None,
+                   error_bitmap=None, chunk_size=TABLE_CHUNK_SIZE, approximation=None):
+    """Write a table of function over a grid to output, chunk by chunk.
+
+    function is a one-operand operation name such as "sine", or an
+    expression in x such as "log10(x) * 2". The grid is described by
+    start, stop and step or count (see table_grid); points are computed as
+    start + i * spacing, so no rounding error accumulates. Memory use is
+    constant whatever the number of points.
+
+    The format follows output's extension: .csv writes x,result,error
+    rows, .npy and anything else (raw little-endian float64) write only
+    results. Domain-invalid points are NaN and marked: by the error column
+    in CSV output, or in error_bitmap (see process_columns) for binary
+    output. Returns the number of invalid points.
+    """
+    if chunk_size % 8:
+        raise ValueError("chunk_size must be a multiple of 8")
+    pipeline = function_pipeline(function, approximation=approximation)
+    if pipeline.variables not in (["x"], []):
+        raise ValueError("Table functions may only use the variable x")
+    first, spacing, points = table_grid(start, stop, step, count)
+    csv = str(output).endswith(".csv")
+    if csv and error_bitmap is not None:
+        raise ValueError("CSV tables mark errors inline; error_bitmap is for binary output")
+
+    if csv:
+        out = open(output, "w", encoding="utf-8")
+        out.write("x,result,error\n")
+    else:
+        out = create_column(output, points)
+    bitmap = None if error_bitmap is None else create_column_bitmap(error_bitmap, points)
+
+    errors = 0
+    try:
+        for begin in range(0, points, chunk_size):
+            end = min(begin + chunk_size, points)
+            x = first + np.arange(begin, end) * spacing
+            result = pipeline(x=x) if pipeline.variables else pipeline()
+            values = np.broadcast_to(result.values, x.shape)
+            failed = np.broadcast_to(result.errors, x.shape)
+            errors += int(np.count_nonzero(failed))
+            if csv:
+                np.savetxt(out, np.column_stack([x, values, failed]),
+                           fmt=("%.17g", "%.17g", "%d"), delimiter=",")
+            else:
+                out[begin:end] = values
+            if bitmap is not None:
+                bitmap[begin // 8:(end + 7) // 8] = np.packbits(failed)
+    finally:
+        if csv:
+            out.close()
+        for mapped in (out, bitmap):
+            if isinstance(mapped, np.memmap):
+                mapped.flush()
+    return errors
+
+
+# Columnar result files: one typed column per field, so results move
+# between jobs as bulk copies instead of formatted strings
+RESULT_COLUMNS = {"code": "i1", "x": "<f8", "y": "<f8", "result": "<f8", "error": "?"}
+ARROW_SUFFIXES = (".arrow", ".feather")
+
+
+def batch_columns(name, result, *operands):
+    """Return the result columns of a BatchResult of operation name on operands.
+
+    code holds the operation's history code, y is NaN for one-operand
+    operations and error is the result's error mask.
+    """
+    operation = get_operation(name)
+    if len(operands) != operation.arity:
+        raise ValueError(f"{name} takes {operation.arity} operand(s)")
+    shape = result.values.shape
+    x, y = (np.broadcast_to(_as_array(operand), shape).ravel()
+            for operand in (*operands, math.nan)[:2])
+    return {
+        "code": np.full(result.values.size, OPERATION_CODES[name], dtype=np.int8),
+        "x": x,
+        "y": y,
+        "result": result.values.ravel(),
+        "error": result.errors.ravel(),
+    }
+
+
+def save_columns(path, columns):
+    """Write result columns (see RESULT_COLUMNS) to path.
+
+    Paths ending in .arrow or .feather are written as an Arrow IPC file,
+    which needs pyarrow; anything else is an uncompressed .npz archive of
+    one .npy array per column.
+    """
+    if set(columns) != set(RESULT_COLUMNS):
+        raise ValueError(f"Result columns must be exactly: {', '.join(RESULT_COLUMNS)}")
+    columns = {name: np.asarray(columns[name], dtype=dtype)
+               for name, dtype in RESULT_COLUMNS.items()}
+    if len({len(column) for column in columns.values()}) != 1:
+        raise ValueError("Result columns must all have the same length")
+
+    if str(path).endswith(ARROW_SUFFIXES):
+        pa = _import_arrow()
+        table = pa.table(columns)
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        with open(path, "wb") as f:  # A file object keeps savez from renaming the path
+            np.savez(f, **columns)
+
+
+def load_columns(path):
+    """Read result columns written by save_columns as a dict of arrays."""
+    if str(path).endswith(ARROW_SUFFIXES):
+        pa = _import_arrow()
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+            columns = {name: table.column(name).to_numpy()
+                       for name in RESULT_COLUMNS if name in table.column_names}
+    else:
+        with np.load(path) as archive:
+            columns = {name: archive[name] for name in RESULT_COLUMNS if name in archive.files}
+    missing = set(RESULT_COLUMNS).difference(columns)
+    if missing:
+        raise ValueError(f"Not a result column file (missing {sorted(missing)[0]}): {path}")
+    return {name: np.asarray(columns[name], dtype=dtype) for name, dtype in RESULT_COLUMNS.items()}
+
+
+def _import_arrow():
+    """Return the pyarrow module, which Arrow IPC files need."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("Arrow IPC files need the pyarrow package") from None
+    return pyarrow
+
+
+def run_batch(lines, out=None, calc=None, chunk_size=1024, workers=1,
+              parallel_chunk_size=None):
+    """Evaluate expressions line by line and stream the results to out.
+
+    Lines are processed as a generator pipeline and written in chunks of
+    chunk_size, so memory use stays constant for inputs of any size.
+    Errors are reported on their own output line without stopping the
+    stream. With workers > 1 the lines are evaluated on a process pool
+    (see parallel_evaluate). Returns the number of lines that failed.
+    """
+    out = sys.stdout if out is None else out
+    calc = Calculator() if calc is None else calc
+    errors = 0
+
+    def count_errors(results):
+        nonlocal errors
+        for item in results:
+            if item[3] is not None:
+                errors += 1
+            yield item
+
+    expressions = read_expressions(lines)
+    if workers > 1:
+        results = parallel_evaluate(expressions, workers, parallel_chunk_size, calc.precision)
+    else:
+        results = evaluate_expressions(calc, expressions)
+    output = format_results(count_errors(results))
+    while True:
+        chunk = list(islice(output, chunk_size))
+        if not chunk:
+            break
+        out.write("".join(chunk))
+    out.flush()
+    return errors
+
+
+def parse_address(address):
+    """Parse "unix:PATH" or "HOST:PORT" into ("unix", path) or ("tcp", host, port)."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Invalid address: {address}")
+    return "tcp", host or "127.0.0.1", int(port)
+
+
+class CalculatorServer:
+    """asyncio server exposing every Calculator operation over a socket.
+
+    The protocol is line-delimited text. Each request is an operation name
+    followed by its operands, e.g. "divide 10 4", and each response is
+    "ok <result>" or "err <message>", in request order. Clients may
+    pipeline any number of requests on one connection. Requests that
+    arrive together are micro-batched: they are grouped by operation and
+    evaluated with one vectorized BatchCalculator call per group.
+    """
+
+    def __init__(self, read_size=65536, max_line=1024):
+        """Configure the read size (bounding each micro-batch) and line limit."""
+        self.read_size = read_size
+        self.max_line = max_line
+        self.batch = BatchCalculator()
+
+    async def start(self, address):
+        """Start listening on address (see parse_address); returns the server."""
+        kind, *where = parse_address(address)
+        if kind == "unix":
+            return await asyncio.start_unix_server(self.handle, path=where[0])
+        return await asyncio.start_server(self.handle, *where)
+
+    async def handle(self, reader, writer):
+        """Serve one connection until the client closes it."""
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(self.read_size)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                if lines:
+                    writer.write(self.respond(lines))
+                    # Backpressure: read no more until the client has
+                    # consumed enough of our responses
+                    await writer.drain()
+                if len(pending) > self.max_line:
+                    writer.write(b"err Request line too long\n")
+                    pending = b""  # Rejected, so never evaluated below
+                    break
+            if pending.strip():
+                writer.write(self.respond([pending]))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, lines):
+        """Evaluate a micro-batch of request lines; return the encoded responses."""
+        responses = []
+        groups = {}  # Operation -> (response slots, operand rows)
+        for line in lines:
+            parts = line.decode("utf-8", "replace").split()
+            if not parts:
+                continue
+            name, *operands = parts
+            try:
+                arity = get_operation(name).arity
+                if len(operands) != arity:
+                    raise ValueError(f"{name} takes {arity} operand(s)")
+                row = [float(operand) for operand in operands]
+            except ValueError as e:
+                responses.append(f"err {e}")
+                continue
+            slots, rows = groups.setdefault(name, ([], []))
+            slots.append(len(responses))
+            rows.append(row)
+            responses.append(None)
+
+        for name, (slots, rows) in groups.items():
+            result = self.batch.apply(name, *np.array(rows).T)
+            message = f"err {result.message}"
+            for slot, value, error in zip(slots, result.values.tolist(), result.errors.tolist()):
+                responses[slot] = message if error else f"ok {value!r}"
+
+        if not responses:
+            return b""
+        return ("\n".join(responses) + "\n").encode()
+
+
+def serve(address):
+    """Run a CalculatorServer on address until interrupted."""
+    async def run():
+        server = await CalculatorServer().start(address)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+class CalculatorClient:
+    """Client for CalculatorServer supporting pipelined requests."""
+
+    def __init__(self, reader, writer):
+        """Wrap an open connection; use CalculatorClient.connect instead."""
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, address):
+        """Open a connection to the server at address."""
+        kind, *where = parse_address(address)
+        if kind == "unix":
+            reader, writer = await asyncio.open_unix_connection(where[0])
+        else:
+            reader, writer = await asyncio.open_connection(*where)
+        return cls(reader, writer)
+
+    async def call(self, name, *operands):
+        """Perform one operation; raises ValueError on a server-side error."""
+        [(value, error)] = await self.pipeline([(name, *operands)])
+        if error is not None:
+            raise ValueError(error)
+        return value
+
+    async def pipeline(self, requests):
+        """Send (name, *operands) requests without waiting between them.
+
+        Returns one (value, error_message) pair per request, in order.
+        Sending and receiving run concurrently, so pipelines of any length
+        cooperate with the server's backpressure.
+        """
+        requests = list(requests)
+
+        async def send():
+            for name, *operands in requests:
+                self._writer.write(" ".join([name, *map(repr, operands)]).encode() + b"\n")
+                await self._writer.drain()
+
+        async def receive():
+            results = []
+            for _ in requests:
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError("Server closed the connection")
+                status, _, payload = line.decode().rstrip("\n").partition(" ")
+                results.append((float(payload), None) if status == "ok" else (None, payload))
+            return results
+
+        _, results = await asyncio.gather(send(), receive())
+        return results
+
+    async def close(self):
+        """Close the connection."""
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def load_test(address, requests, connections=4):
+    """Pipeline requests over several concurrent connections.
+
+    Every connection sends the full list of requests. Returns the total
+    request count, elapsed seconds and requests per second.
+    """
+    clients = [await CalculatorClient.connect(address) for _ in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client.pipeline(requests) for client in clients))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    total = len(requests) * connections
+    return {"requests": total, "seconds": elapsed, "per_second": total / elapsed}
+
+
+def get_number(prompt):
+    """Get a valid number from user input with error handling."""
+    while True:
+        try:
+            value = input(prompt)
+            if value.lower() == 'q':
+                return None
+            return float(value)
+        except ValueError:
+            print("Invalid input. Please enter a valid number or 'q' to quit.")
+
+
+def get_two_numbers():
+    """Get two numbers from user input."""
+    x = get_number("Enter first number (or 'q' to quit): ")
+    if x is None:
+        return None, None
+    
+    y = get_number("Enter second number (or 'q' to quit): ")
+    if y is None:
+        return None, None
+    
+    return x, y
+
+
+def get_one_number():
+    """Get one number from user input."""
+    return get_number("Enter number (or 'q' to quit): ")
+
+
+def get_operands(arity):
+    """Get the operands for an operation, or None if the user quits."""
+    if arity == 2:
+        x, y = get_two_numbers()
+        return None if x is None or y is None else (x, y)
+    x = get_one_number()
+    return None if x is None else (x,)
+
+
+def menu_entries():
+    """Return registered operation names in menu order, grouped by section."""
+    sections = {}
+    for name in OPERATION_NAMES:
+        sections.setdefault(OPERATIONS[name].section, []).append(name)
+    return [name for names in sections.values() for name in names]
+
+
+def display_menu():
+    """Display the main calculator menu."""
+    entries = menu_entries()
+    print("\n" + "="*50)
+    print("       ADVANCED PYTHON CALCULATOR")
+    print("="*50)
+    section = None
+    for number, name in enumerate(entries, 1):
+        operation = OPERATIONS[name]
+        if operation.section != section:
+            print(("\n" if section else "") + f"{operation.section}:")
+            section = operation.section
+        print(f"{number:>3}. {operation.label}")
+    print("\nUtilities:")
+    for number, label in enumerate(("Show History", "Clear History", "Quit"), len(entries) + 1):
+        print(f"{number:>3}. {label}")
+    print("="*50)
+
+
+def parse_args(argv):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Advanced Python Calculator")
+    parser.add_argument(
+        "--batch", metavar="FILE", nargs="?", const="-",
+        help="evaluate one expression per line from FILE (default: stdin) and exit",
+    )
+    parser.add_argument(
+        "--eval", metavar="EXPRESSION",
+        help='print the value of one expression, such as "log10(1000) * 2", and exit',
+    )
+    parser.add_argument(
+        "--columns", nargs="+", metavar="ARG",
+        help="apply OPERATION to float64 column files (.npy or raw) or numbers: "
+             "--columns OPERATION INPUT [INPUT] --output FILE",
+    )
+    parser.add_argument(
+        "--table", nargs=3, metavar=("FUNCTION", "START", "STOP"),
+        help="tabulate FUNCTION (an operation or expression in x) from START to STOP "
+             "with --step or --count into --output (.csv, .npy or raw float64)",
+    )
+    parser.add_argument(
+        "--step", type=float, help="grid spacing for --table (STOP excluded)",
+    )
+    parser.add_argument(
+        "--count", type=int, help="number of grid points for --table (STOP included)",
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="output file for --columns and --table",
+    )
+    parser.add_argument(
+        "--error-bitmap", metavar="FILE",
+        help="with --columns or a binary --table, write one domain-error bit per element to FILE",
+    )
+    parser.add_argument(
+        "--serve", metavar="ADDRESS",
+        help="run the calculation server on HOST:PORT or unix:PATH",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="evaluate batch input on N processes (0 for one per CPU core)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, metavar="N",
+        help="lines per parallel work unit (default: tuned automatically)",
+    )
+    parser.add_argument(
+        "--precision", choices=PRECISION_MODES, default="float",
+        help="adaptive escalates to exact arithmetic when floats overflow",
+    )
+    parser.add_argument(
+        "--history-log", metavar="FILE",
+        help="also append every calculation to a persistent binary log at FILE",
+    )
+    return parser.parse_args(argv)
+
+
+def eval_main(expression, precision="float"):
+    """Run --eval mode: print one expression's value. Returns an exit status."""
+    try:
+        text = str(_printable(Calculator(precision=precision).evaluate(expression)))
+    except (ValueError, ArithmeticError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(text)
+    return 0
+
+
+def batch_main(path, workers=1, chunk_size=None, precision="float"):
+    """Run batch mode on a file path, or stdin for "-". Returns an exit status."""
+    options = {
+        "calc": Calculator(precision=precision),
+        "workers": workers,
+        "parallel_chunk_size": chunk_size,
+    }
+    if path == "-":
+        errors = run_batch(sys.stdin, **options)
+    else:
+        with open(path, encoding="utf-8") as lines:
+            errors = run_batch(lines, **options)
+    return 1 if errors else 0
+
+
+def columns_main(arguments, output, error_bitmap=None):
+    """Run --columns mode. Returns an exit status."""
+    if output is None:
+        print("--columns needs --output", file=sys.stderr)
+        return 2
+    name, *operands = arguments
+
+    def operand(text):
+        try:
+            return float(text)
+        except ValueError:
+            return text  # A column file path
+
+    try:
+        errors = process_columns(name, [operand(a) for a in operands], output, error_bitmap)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{output}: {errors} domain error(s)")
+    return 0
+
+
+def table_main(arguments, output, step=None, count=None, error_bitmap=None):
+    """Run --table mode. Returns an exit status."""
+    if output is None:
+        print("--table needs --output", file=sys.stderr)
+        return 2
+    function, start, stop = arguments
+    try:
+        errors = generate_table(function, float(start), float(stop), output,
+                                step=step, count=count, error_bitmap=error_bitmap)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{output}: {errors} invalid point(s)")
+    return 0
+
+
+def main():
+    """Main calculator function with interactive menu."""
+    args = parse_args(sys.argv[1:])
+    if args.eval is not None:
+        sys.exit(eval_main(args.eval, args.precision))
+    if args.columns:
+        sys.exit(columns_main(args.columns, args.output, args.error_bitmap))
+    if args.table:
+        sys.exit(table_main(args.table, args.output, args.step, args.count, args.error_bitmap))
+    if args.serve:
+        serve(args.serve)
+        return
+    if args.batch is not None:
+        workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+        sys.exit(batch_main(args.batch, workers, args.chunk_size, args.precision))
+
+    calc = Calculator(log_path=args.history_log, precision=args.precision)
+    
+    print("Welcome to the Advanced Python Calculator!")
+    print("This calculator supports floating-point arithmetic and scientific functions.")
+    print("You can quit any operation by entering 'q'.")
+    
+    try:
+        while True:
+            display_menu()
+            entries = menu_entries()
+            choices = {str(number): name for number, name in enumerate(entries, 1)}
+            show_choice, clear_choice, quit_choice = (str(len(entries) + n) for n in (1, 2, 3))
+        
+            try:
+                choice = input(f"\nSelect an operation (1-{quit_choice}): ").strip()
+            
+                if choice == quit_choice or choice.lower() == 'q':
+                    print("Thank you for using the Advanced Python Calculator!")
+                    sys.exit(0)
+            
+                elif choice in choices:
+                    name = choices[choice]
+                    operands = get_operands(OPERATIONS[name].arity)
+                    if operands is None:
+                        continue
+                    result = calc.calculate(name, *operands)
                 
-            elif choice == '13':  # Exponential
-                x = get_one_number()
-                if x is None:
+                elif choice == show_choice:
+                    calc.show_history()
+                    input("Press Enter to continue...")
                     continue
-                result = calc.exponential(x)
-                operation = f"exp({x})"
                 
-            elif choice == '14':  # Degrees to Radians
-                x = get_one_number()
-                if x is None:
+                elif choice == clear_choice:
+                    calc.clear_history()
+                    input("Press Enter to continue...")
                     continue
-                result = calc.degrees_to_radians(x)
-                operation = f"{x}° to radians"
                 
-            elif choice == '15':  # Radians to Degrees
-                x = get_one_number()
-                if x is None:
+                else:
+                    print(f"Invalid choice. Please select a number from 1-{quit_choice}.")
+                    input("Press Enter to continue...")
                     continue
-                result = calc.radians_to_degrees(x)
-                operation = f"{x} radians to degrees"
-                
-            elif choice == '16':  # Show History
-                calc.show_history()
+            
+                # Display result and add to history
+                print(f"\nResult: {result}")
+                calc.record(name, result, *operands)
                 input("Press Enter to continue...")
-                continue
-                
-            elif choice == '17':  # Clear History
-                calc.clear_history()
+            
+            except ValueError as e:
+                print(f"\nError: {e}")
                 input("Press Enter to continue...")
-                continue
-                
-            else:
-                print("Invalid choice. Please select a number from 1-18.")
+            except KeyboardInterrupt:
+                print("\n\nCalculator interrupted. Goodbye!")
+                calc.close()
+                sys.exit(0)
+            except Exception as e:
+                print(f"\nUnexpected error: {e}")
                 input("Press Enter to continue...")
-                continue
-            
-            # Display result and add to history
-            print(f"\nResult: {result}")
-            calc.add_to_history(operation, result)
-            input("Press Enter to continue...")
-            
-        except ValueError as e:
-            print(f"\nError: {e}")
-            input("Press Enter to continue...")
-        except KeyboardInterrupt:
-            print("\n\nCalculator interrupted. Goodbye!")
-            sys.exit(0)
-        except Exception as e:
-            print(f"\nUnexpected error: {e}")
-            input("Press Enter to continue...")
 
+    finally:
+        calc.close()  # Flush buffered log records however the session ends
 
 if __name__ == "__main__":
     main()
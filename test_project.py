@@ -8,9 +8,55 @@ Comprehensive pytest tests covering:
 - Input validation
 """
 
+import asyncio
+import decimal
+import io
+import json
 import pytest
 import math
-from project import Calculator
+import numpy as np
+import os
+import project
+import subprocess
+import sys
+import threading
+import time
+from fractions import Fraction
+from project import (
+    ApproximateMath,
+    batch_columns,
+    bisect_roots,
+    Calculator,
+    CalculatorClient,
+    CalculatorServer,
+    ExpressionCompiler,
+    ExpressionGraph,
+    format_results,
+    generate_table,
+    HistoryLog,
+    HistoryLogReader,
+    HISTORY_INITIAL_SLOTS,
+    integrate,
+    load_columns,
+    newton_roots,
+    RunningStats,
+    STATUS_FAILED,
+    STATUS_MESSAGES,
+    STATUS_OK,
+    STATUS_OVERFLOW,
+    Operation,
+    Pipeline,
+    load_test,
+    parallel_batch,
+    parallel_evaluate,
+    process_columns,
+    read_error_bitmap,
+    power_by_squaring,
+    register_operation,
+    verify_approximation,
+    run_batch,
+    save_columns,
+)
 
 
 class TestCalculator:
@@ -203,6 +249,37 @@ class TestCalculator:
         self.calc.clear_history()
         assert len(self.calc.history) == 0
     
+    def test_record_formats_lazily(self):
+        """Test compact records format like the interactive menu output."""
+        self.calc.record("add", 5.0, 2.0, 3.0)
+        self.calc.record("square_root", 4.0, 16.0)
+        self.calc.record("degrees_to_radians", math.pi, 180.0)
+        assert list(self.calc.history) == [
+            "2.0 + 3.0 = 5.0",
+            "sqrt(16.0) = 4.0",
+            f"180.0° to radians = {math.pi}",
+        ]
+        assert self.calc.history[-1] == f"180.0° to radians = {math.pi}"
+
+    def test_record_non_float_result(self):
+        """Test results that do not fit a float record are still kept."""
+        self.calc.record("power", complex(1, 2), -1.0, 0.5)
+        assert self.calc.history[0] == "-1.0 ** 0.5 = (1+2j)"
+
+    def test_history_capacity(self):
+        """Test history is a bounded ring buffer keeping the newest records."""
+        calc = Calculator(history_size=3)
+        for i in range(5):
+            calc.record("multiply", i * 2.0, float(i), 2.0)
+        assert len(calc.history) == 3
+        assert calc.history[0] == "2.0 * 2.0 = 4.0"
+        assert calc.history[-1] == "4.0 * 2.0 = 8.0"
+        assert calc.history[-10:] == list(calc.history)
+        with pytest.raises(IndexError):
+            calc.history[3]
+        with pytest.raises(ValueError):
+            Calculator(history_size=0)
+    
     # Test Edge Cases and Special Values
     
     def test_large_numbers(self):
@@ -245,6 +322,1150 @@ class TestCalculator:
         assert self.calc.power(-2, 2) == 4
 
 
+class TestBatchCalculator:
+    """Test class for the vectorized batch API."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.batch = Calculator().batch
+
+    def test_batch_arithmetic(self):
+        """Test vectorized arithmetic matches the scalar operations."""
+        result = self.batch.add([1, 2, 3], [4, 5, 6])
+        assert result.values.tolist() == [5, 7, 9]
+        assert result.ok
+        assert self.batch.multiply([1.5, -2], 2).values.tolist() == [3, -4]
+        assert self.batch.modulo([-10, 10.5], 3).values == pytest.approx([2, 1.5])
+
+    def test_batch_divide_by_zero_mask(self):
+        """Test division flags zero divisors per element instead of raising."""
+        result = self.batch.divide([10, 5, 9], [2, 0, 3])
+        assert result.errors.tolist() == [False, True, False]
+        assert result.values[0] == 5 and result.values[2] == 3
+        assert np.isnan(result.values[1])
+        assert result.message == "Cannot divide by zero"
+        assert not result.ok
+        assert self.batch.divide([10, 5], [2, 1]).message is None
+
+    def test_batch_domain_masks(self):
+        """Test square root and logarithm domain errors are masked."""
+        result = self.batch.square_root([9, -1, 0.25])
+        assert result.errors.tolist() == [False, True, False]
+        assert result.values[[0, 2]].tolist() == [3, 0.5]
+        assert self.batch.natural_log([math.e, 0, -1]).errors.tolist() == [False, True, True]
+        assert self.batch.log_base_10([100, 0]).values[0] == pytest.approx(2)
+
+    def test_batch_overflow_masks(self):
+        """Test power and exponential flag overflowing elements."""
+        result = self.batch.power([2, 10], [3, 1000])
+        assert result.values[0] == 8
+        assert result.errors.tolist() == [False, True]
+        assert self.batch.exponential([0, 1000]).errors.tolist() == [False, True]
+
+    def test_batch_scientific(self):
+        """Test vectorized trigonometry and angle conversion."""
+        x = np.array([0, math.pi / 2])
+        assert self.batch.sine(x).values == pytest.approx([0, 1])
+        assert self.batch.cosine(x).values == pytest.approx([1, 0], abs=1e-10)
+        assert self.batch.degrees_to_radians([180]).values == pytest.approx([math.pi])
+        assert self.batch.radians_to_degrees(math.pi).values == pytest.approx(180)
+
+
+class TestExpressions:
+    """Test class for the expression compiler and its cache."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.calc = Calculator()
+
+    def test_evaluate_expression(self):
+        """Test expressions evaluate through Calculator operations."""
+        assert self.calc.evaluate("2 + 3 * 4") == 14
+        assert self.calc.evaluate("sqrt(x**2 + y**2) / log10(z)", x=3, y=4, z=100) == 2.5
+        assert self.calc.evaluate("-x % 3", x=10) == 2
+        assert self.calc.evaluate("sin(pi / 2)") == pytest.approx(1)
+        assert self.calc.evaluate("ln(e)") == pytest.approx(1)
+
+    def test_expression_domain_errors(self):
+        """Test domain errors from Calculator operations propagate."""
+        with pytest.raises(ValueError, match="Cannot divide by zero"):
+            self.calc.evaluate("x / 0", x=1)
+        with pytest.raises(ValueError, match="Logarithm undefined"):
+            self.calc.evaluate("log10(x)", x=-1)
+
+    def test_invalid_expressions(self):
+        """Test invalid syntax, functions and variables raise ValueError."""
+        with pytest.raises(ValueError, match="Invalid expression"):
+            self.calc.evaluate("2 +")
+        with pytest.raises(ValueError, match="Unsupported function"):
+            self.calc.evaluate("open(x)", x=1)
+        with pytest.raises(ValueError, match="Unsupported syntax"):
+            self.calc.evaluate("x.real", x=1)
+        with pytest.raises(ValueError, match="Undefined variable: y"):
+            self.calc.evaluate("x + y", x=1)
+
+    def test_compiled_expression_cache(self):
+        """Test compiled forms are reused and evicted least recently used first."""
+        compiler = ExpressionCompiler(maxsize=2)
+        first = compiler.compile("x + 1")
+        assert compiler.compile("x + 1") is first
+        assert first(self.calc, x=1) == 2
+        assert first(self.calc, x=41) == 42
+
+        compiler.compile("x + 2")
+        compiler.compile("x + 1")  # Refresh so "x + 2" is least recent
+        compiler.compile("x + 3")
+        assert len(compiler) == 2
+        assert compiler.compile("x + 1") is first
+
+
+def test_run_batch_streams_results():
+    """Test batch mode evaluates each line and reports errors per line."""
+    lines = io.StringIO("1 + 2\n# comment\n\n10 / 0\nsqrt(16)\n")
+    out = io.StringIO()
+    errors = run_batch(lines, out, chunk_size=1)
+    assert errors == 1
+    assert out.getvalue().splitlines() == [
+        "1 + 2 = 3",
+        "line 4: 10 / 0: Error: Cannot divide by zero",
+        "sqrt(16) = 4.0",
+    ]
+
+
+def test_run_batch_is_lazy():
+    """Test batch mode writes output before the input is used up."""
+    out = io.StringIO()
+
+    def lines():
+        for i in range(5000):
+            if i == 3000:
+                assert out.getvalue().startswith("0 * 2 = 0\n")
+            yield f"{i} * 2\n"
+
+    assert run_batch(lines(), out) == 0
+    assert out.getvalue().splitlines()[-1] == "4999 * 2 = 9998"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_complex_intermediate(workers):
+    """Test a complex intermediate value fails its own line, not the stream."""
+    out = io.StringIO()
+    lines = ["(-8) ** 0.5\n", "sqrt((-8)**0.5)\n", "1+1\n"]
+    assert run_batch(lines, out, workers=workers) == 1
+    output = out.getvalue().splitlines()
+    assert output[1] == "line 2: sqrt((-8)**0.5): Error: Operands must be real numbers"
+    assert output[2] == "1+1 = 2"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_deeply_nested_line(workers):
+    """Test an expression too deep to compile fails its own line, not the stream."""
+    out = io.StringIO()
+    assert run_batch(["1" + "+1" * 20000 + "\n", "1+1\n"], out, workers=workers) == 1
+    output = out.getvalue().splitlines()
+    assert output[0].endswith(": Error: Expression too deeply nested")
+    assert output[1] == "1+1 = 2"
+
+
+def test_parallel_evaluate_keeps_order():
+    """Test parallel evaluation returns results in input order with errors."""
+    expressions = [(i, f"{i} / ({i} % 7)") for i in range(1, 301)]
+    results = list(parallel_evaluate(expressions, workers=2, chunk_size=16))
+    assert [r[0] for r in results] == list(range(1, 301))
+    assert results[0][2] == 1.0
+    assert results[6][2] is None
+    assert str(results[6][3]) == "Cannot divide by zero"
+
+
+def test_parallel_evaluate_auto_chunks():
+    """Test the auto-tuned chunk size handles inputs of varying size."""
+    expressions = ((i, f"sqrt({i})") for i in range(2000))
+    results = list(parallel_evaluate(expressions, workers=2))
+    assert len(results) == 2000
+    assert results[-1][2] == math.sqrt(1999)
+
+
+def test_parallel_batch_columns():
+    """Test parallel column evaluation matches the serial batch API."""
+    x = np.arange(-50, 50, dtype=float)
+    result = parallel_batch("divide", 100, x, workers=2, chunk_size=7)
+    expected = Calculator().batch.divide(100, x)
+    assert np.array_equal(result.errors, expected.errors)
+    assert np.allclose(result.values, expected.values, equal_nan=True)
+    assert result.message == "Cannot divide by zero"
+    assert parallel_batch("divide", 100, x + 100, workers=2, chunk_size=7).message is None
+
+
+def test_run_batch_parallel():
+    """Test batch mode can evaluate lines on a process pool."""
+    lines = io.StringIO("".join(f"{i} * 2\n" for i in range(100)) + "1 / 0\n")
+    out = io.StringIO()
+    assert run_batch(lines, out, workers=2) == 1
+    output = out.getvalue().splitlines()
+    assert output[99] == "99 * 2 = 198"
+    assert output[100] == "line 101: 1 / 0: Error: Cannot divide by zero"
+
+
+def test_process_columns_raw(tmp_path):
+    """Test chunked column processing over raw float64 files."""
+    x = np.arange(-10, 13, dtype="<f8")
+    x.tofile(tmp_path / "x.f64")
+    errors = process_columns("divide", [1.0, tmp_path / "x.f64"], tmp_path / "out.f64",
+                             error_bitmap=tmp_path / "errors.bin", chunk_size=8)
+    assert errors == 1
+    result = np.fromfile(tmp_path / "out.f64", dtype="<f8")
+    expected = Calculator().batch.divide(1.0, x)
+    assert np.allclose(result, expected.values, equal_nan=True)
+    assert np.array_equal(read_error_bitmap(tmp_path / "errors.bin", len(x)), x == 0)
+
+
+def test_process_columns_npy(tmp_path):
+    """Test .npy columns are memory-mapped in and written back as .npy."""
+    np.save(tmp_path / "a.npy", np.arange(20.0))
+    np.save(tmp_path / "b.npy", np.full(20, 2.0))
+    assert process_columns("power", [tmp_path / "a.npy", tmp_path / "b.npy"],
+                           tmp_path / "out.npy", chunk_size=16) == 0
+    assert np.array_equal(np.load(tmp_path / "out.npy"), np.arange(20.0) ** 2)
+
+    np.save(tmp_path / "short.npy", np.arange(3.0))
+    with pytest.raises(ValueError, match="column length"):
+        process_columns("add", [tmp_path / "a.npy", tmp_path / "short.npy"], tmp_path / "x.npy")
+
+
+def test_generate_table_csv(tmp_path):
+    """Test CSV tables mark invalid points instead of aborting."""
+    path = tmp_path / "log.csv"
+    assert generate_table("log_base_10", -1, 1000, path, step=250) == 1
+    rows = path.read_text().splitlines()
+    assert rows[0] == "x,result,error"
+    assert rows[1] == "-1,nan,1"
+    assert [float(value) for value in rows[-1].split(",")] == [999, math.log10(999), 0]
+    assert len(rows) == 6
+
+
+def test_generate_table_binary(tmp_path):
+    """Test binary tables stream in chunks with an error bitmap."""
+    errors = generate_table("sqrt(x) * 2", -1, 1, tmp_path / "t.npy", count=21,
+                            error_bitmap=tmp_path / "t.bits", chunk_size=8)
+    x = np.linspace(-1, 1, 21)
+    assert errors == 10
+    assert np.isnan(np.load(tmp_path / "t.npy")[:10]).all()
+    assert np.allclose(np.load(tmp_path / "t.npy")[10:], np.sqrt(x[10:]) * 2)
+    assert np.array_equal(read_error_bitmap(tmp_path / "t.bits", 21), x < 0)
+
+    generate_table("exponential", 0, 1, tmp_path / "t.f64", count=3)
+    assert np.allclose(np.fromfile(tmp_path / "t.f64"), np.exp([0, 0.5, 1]))
+    with pytest.raises(ValueError, match="exactly one of step and count"):
+        generate_table("sine", 0, 1, tmp_path / "t.f64")
+    generate_table("log10", 1, 100, tmp_path / "t.f64", count=3)
+    assert np.allclose(np.fromfile(tmp_path / "t.f64"), np.log10([1, 50.5, 100]))
+    with pytest.raises(ValueError, match="only use the variable x"):
+        generate_table("x + y", 0, 1, tmp_path / "t.f64", step=0.1)
+    with pytest.raises(ValueError, match="Unknown function: sinh"):
+        generate_table("sinh", 0, 1, tmp_path / "t.f64", step=0.1)
+
+
+def test_server_micro_batch_responses():
+    """Test a micro-batch is answered in request order with per-line errors."""
+    response = CalculatorServer().respond([
+        b"add 2 3", b"divide 1 0", b"", b"sqrt 4", b"divide 9 3", b"sine x", b"add 1",
+    ])
+    assert response.decode().splitlines() == [
+        "ok 5.0",
+        "err Cannot divide by zero",
+        "err Unknown operation: sqrt",
+        "ok 3.0",
+        "err could not convert string to float: 'x'",
+        "err add takes 2 operand(s)",
+    ]
+
+
+def test_server_pipelining(tmp_path):
+    """Test pipelined requests over a socket with the client library."""
+    address = f"unix:{tmp_path / 'calc.sock'}"
+
+    async def scenario():
+        server = await CalculatorServer(read_size=64).start(address)
+        async with server:
+            client = await CalculatorClient.connect(address)
+            assert await client.call("power", 2, 10) == 1024
+            with pytest.raises(ValueError, match="Logarithm undefined"):
+                await client.call("natural_log", 0)
+            requests = [("multiply", i, 2) for i in range(2000)]
+            results = await client.pipeline(requests)
+            assert [value for value, _ in results] == [i * 2 for i in range(2000)]
+            await client.close()
+            stats = await load_test(address, requests[:100], connections=3)
+            assert stats["requests"] == 300
+
+    asyncio.run(scenario())
+
+
+def test_server_rejects_long_line(tmp_path):
+    """Test complete lines are answered before an over-long line is rejected."""
+    path = str(tmp_path / "calc.sock")
+
+    async def scenario():
+        server = await CalculatorServer(max_line=16).start(f"unix:{path}")
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b"add 1 2\nadd " + b"1" * 40 + b" 2")
+            writer.write_eof()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    assert asyncio.run(scenario()) == b"ok 3.0\nerr Request line too long\n"
+
+
+def test_history_log_roundtrip(tmp_path):
+    """Test history log records survive reopening and batch their writes."""
+    path = tmp_path / "history.log"
+    with HistoryLog(path, batch_size=2) as log:
+        log.append("add", 5.0, 2.0, 3.0, timestamp=100.0)
+        assert len(HistoryLogReader(path)) == 0  # Still buffered
+        log.append("square_root", 4.0, 16.0, timestamp=101.0)
+        assert len(HistoryLogReader(path)) == 2
+
+    with HistoryLog(path) as log:  # Appending to an existing log
+        log.append("divide", 2.0, 10.0, 5.0, timestamp=50.0)
+
+    with HistoryLogReader(path) as reader:
+        assert len(reader) == 3
+        assert reader.format(reader[0]) == "2.0 + 3.0 = 5.0"
+        assert reader.format(reader[1]) == "sqrt(16.0) = 4.0"
+        assert reader[2]["timestamp"] == 101.0  # Timestamps never decrease
+
+
+def test_history_log_drops_torn_record(tmp_path):
+    """Test reopening a log that ends in a partial record keeps appends aligned."""
+    path = tmp_path / "history.log"
+    with HistoryLog(path) as log:
+        log.append("add", 5.0, 2.0, 3.0, timestamp=10.0)
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (project.LOG_RECORD.size // 2))  # Interrupted write
+
+    with HistoryLog(path) as log:
+        log.append("divide", 2.0, 10.0, 5.0, timestamp=20.0)
+
+    with HistoryLogReader(path) as reader:
+        assert reader.query()["timestamp"].tolist() == [10.0, 20.0]
+        assert reader.format(reader[1]) == "10.0 / 5.0 = 2.0"
+
+
+def test_history_log_flushed_when_input_ends(tmp_path):
+    """Test the interactive session flushes its log even when stdin runs out."""
+    path = tmp_path / "history.log"
+    subprocess.run([sys.executable, project.__file__, "--history-log", str(path)],
+                   input="1\n2\n3\n\n", capture_output=True, text=True)
+    with HistoryLogReader(path) as reader:
+        assert reader.format(reader[0]) == "2.0 + 3.0 = 5.0"
+
+
+def test_history_log_queries(tmp_path):
+    """Test queries by operation and timestamp range use the indexes."""
+    path = tmp_path / "history.log"
+    with HistoryLog(path) as log:
+        for t in range(10):
+            name = "divide" if t % 2 else "multiply"
+            log.append(name, float(t), float(t), 1.0, timestamp=float(t))
+
+    with HistoryLogReader(path) as reader:
+        assert len(reader.query()) == 10
+        assert reader.query("divide")["x"].tolist() == [1, 3, 5, 7, 9]
+        assert reader.query("divide", since=4, until=8)["x"].tolist() == [5, 7]
+        assert reader.query(since=8)["x"].tolist() == [8, 9]
+        assert len(reader.query("sine")) == 0
+
+        with HistoryLog(path) as log:
+            log.append("divide", 11.0, 11.0, 1.0, timestamp=11.0)
+        reader.refresh()
+        assert reader.query("divide", since=9)["x"].tolist() == [9, 11]
+
+
+def test_result_columns_roundtrip(tmp_path):
+    """Test batch results round-trip through a columnar .npz file."""
+    x, y = np.array([1.0, 2.0, 3.0]), np.array([1.0, 0.0, 2.0])
+    columns = batch_columns("divide", Calculator().batch.divide(x, y), x, y)
+    save_columns(tmp_path / "results.npz", columns)
+    loaded = load_columns(tmp_path / "results.npz")
+    assert loaded["code"].tolist() == [project.OPERATION_CODES["divide"]] * 3
+    assert loaded["code"].dtype == np.int8 and loaded["error"].dtype == bool
+    assert np.array_equal(loaded["y"], y) and loaded["error"].tolist() == [False, True, False]
+    assert np.array_equal(loaded["result"], [1.0, np.nan, 1.5], equal_nan=True)
+
+    unary = batch_columns("sine", Calculator().batch.sine(0.0), 0.0)
+    assert unary["result"].tolist() == [0.0] and np.isnan(unary["y"]).all()
+    with pytest.raises(ValueError, match="same length"):
+        save_columns(tmp_path / "bad.npz", dict(columns, x=[1.0]))
+    np.savez(tmp_path / "other.npz", values=np.arange(3))
+    with pytest.raises(ValueError, match="Not a result column file"):
+        load_columns(tmp_path / "other.npz")
+
+
+def test_export_history_columns(tmp_path):
+    """Test history exports as typed columns in order, across threads."""
+    calc = Calculator()
+    calc.record("add", 5.0, 2.0, 3.0)
+    thread = threading.Thread(target=calc.record, args=("square_root", 4.0, 16.0))
+    thread.start()
+    thread.join()
+    calc.add_to_history("2 + 3", 5)
+    calc.export_history(tmp_path / "history.npz")
+    columns = load_columns(tmp_path / "history.npz")
+    codes = project.OPERATION_CODES
+    assert columns["code"].tolist() == [codes["add"], codes["square_root"], project.TEXT_ENTRY]
+    assert columns["x"][:2].tolist() == [2.0, 16.0] and np.isnan(columns["x"][2])
+    assert columns["result"].tolist() == [5.0, 4.0, 5.0]
+    assert not columns["error"].any()
+
+
+def test_arrow_result_columns(tmp_path):
+    """Test result columns round-trip through an Arrow IPC file."""
+    pytest.importorskip("pyarrow")
+    columns = batch_columns("sine", Calculator().batch.sine([0.0, 1.0]), [0.0, 1.0])
+    save_columns(tmp_path / "results.arrow", columns)
+    loaded = load_columns(tmp_path / "results.arrow")
+    assert all(np.array_equal(loaded[name], columns[name], equal_nan=True) for name in columns)
+
+
+def test_calculator_writes_history_log(tmp_path):
+    """Test Calculator appends recorded calculations to its log."""
+    path = tmp_path / "history.log"
+    calc = Calculator(log_path=path)
+    calc.record("add", 5.0, 2.0, 3.0)
+    calc.close()
+    with HistoryLogReader(path) as reader:
+        assert [reader.format(r) for r in reader.query("add")] == ["2.0 + 3.0 = 5.0"]
+
+    with open(tmp_path / "other.log", "wb") as f:
+        f.write(b"not a log file")
+    with pytest.raises(ValueError, match="Not a calculator history log"):
+        HistoryLogReader(tmp_path / "other.log")
+
+
+class TestMemoization:
+    """Test class for the opt-in memoization layer."""
+
+    def test_memoized_results_and_counters(self):
+        """Test repeated calls are served from the cache."""
+        calc = Calculator(cache_size=16)
+        assert calc.sine(1.0) == math.sin(1.0)
+        assert calc.sine(1.0) == math.sin(1.0)
+        assert calc.power(2, 3) == 8
+        assert calc.add(1, 2) == 3  # Not memoized
+        info = calc.memo.info()
+        assert (info["hits"], info["misses"], info["size"]) == (1, 2, 2)
+
+    def test_memo_keeps_sign_of_zero(self):
+        """Test -0.0 and 0.0 are cached separately."""
+        calc = Calculator(cache_size=16)
+        assert math.copysign(1, calc.sine(0.0)) == 1
+        assert math.copysign(1, calc.sine(-0.0)) == -1
+        assert calc.memo.hits == 0
+
+    def test_memoized_errors(self):
+        """Test domain errors are cached and raised again on a hit."""
+        calc = Calculator(cache_size=16)
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Logarithm undefined"):
+                calc.natural_log(-1)
+        assert calc.memo.hits == 1
+
+    def test_memo_eviction(self):
+        """Test least recently used entries are evicted at the size bound."""
+        calc = Calculator(cache_size=2)
+        calc.exponential(0)
+        calc.exponential(1)
+        calc.exponential(0)  # Refresh so exponential(1) is least recent
+        calc.exponential(2)
+        assert calc.memo.evictions == 1
+        calc.exponential(0)
+        assert calc.memo.info()["hits"] == 2
+
+    def test_memoization_is_opt_in(self):
+        """Test memoization is off by default and can be switched off."""
+        calc = Calculator()
+        assert calc.memo is None
+        calc.enable_memoization(8)
+        calc.cosine(0)
+        assert len(calc.memo) == 1
+        calc.disable_memoization()
+        assert calc.memo is None
+        assert calc.cosine(0) == 1
+
+
+def test_benchmark_compare():
+    """Test benchmark comparison flags only slowdowns past the threshold."""
+    from benchmark import BENCHMARKS, compare, missing_baselines, run_session
+
+    baseline = {"op.add": 100e-9, "op.divide": 100e-9}
+    results = {"op.add": 120e-9, "op.divide": 200e-9, "op.new": 1e-6}
+    assert compare(results, baseline, threshold=0.25) == [("op.divide", 100e-9, 200e-9)]
+    assert missing_baselines(results, baseline) == ["op.new"]
+    assert "op.exponential" in BENCHMARKS and "session.main" in BENCHMARKS
+    run_session()  # The scripted session runs to completion
+
+
+def test_benchmark_budgets():
+    """Test absolute budgets flag only budgeted benchmarks over their limit."""
+    from benchmark import BENCHMARKS, over_budget
+
+    budgets = {"startup.eval": 0.1}
+    assert over_budget({"startup.eval": 0.2, "op.add": 1.0}, budgets) == [("startup.eval", 0.1, 0.2)]
+    assert over_budget({"startup.eval": 0.05}, budgets) == []
+    assert "startup.eval" in BENCHMARKS
+
+
+def test_eval_main(capsys):
+    """Test one-shot evaluation prints the value, or the error on stderr."""
+    assert project.eval_main("log10(1000) * 2") == 0
+    assert capsys.readouterr().out == "6.0\n"
+    assert project.eval_main("1 / 0") == 1
+    assert capsys.readouterr().err == "Error: Cannot divide by zero\n"
+    assert project.eval_main("sqrt((-8)**0.5)") == 1
+    assert capsys.readouterr().err == "Error: Operands must be real numbers\n"
+    assert project.eval_main("10 ** 5000", precision="adaptive") == 0
+    assert capsys.readouterr().out.endswith("E+5000\n")
+
+
+def test_scalar_use_defers_heavy_imports():
+    """Test importing project and evaluating scalars never imports NumPy or asyncio."""
+    code = ("import sys, project; project.Calculator().evaluate('sqrt(2)'); "
+            "print(sorted({'numpy.linalg', 'asyncio.events'} & set(sys.modules)))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(project.__file__)).stdout
+    assert output == "[]\n"
+
+
+class TestInstrumentation:
+    """Test class for per-operation instrumentation."""
+
+    def test_counts_errors_and_histogram(self):
+        """Test calls, errors by type and latency buckets are recorded."""
+        calc = Calculator(instrument=True)
+        calc.divide(10, 2)
+        with pytest.raises(ValueError):
+            calc.divide(1, 0)
+        calc.sine(0)
+        snapshot = calc.metrics.snapshot()
+        assert snapshot["divide"]["calls"] == 2
+        assert snapshot["divide"]["errors"] == {"ValueError": 1}
+        assert sum(snapshot["divide"]["histogram"].values()) == 2
+        assert "add" not in snapshot  # Never called
+
+    def test_instrumentation_is_opt_in(self):
+        """Test operations are the plain methods unless enabled."""
+        calc = Calculator()
+        assert calc.metrics is None
+        assert "add" not in vars(calc)
+        calc.enable_instrumentation()
+        assert "add" in vars(calc)
+        calc.disable_instrumentation()
+        assert "add" not in vars(calc)
+
+    def test_instrumentation_with_memoization(self):
+        """Test instrumentation and memoization layer in either order."""
+        calc = Calculator(cache_size=8, instrument=True)
+        calc.power(2, 3)
+        calc.power(2, 3)
+        assert calc.metrics.snapshot()["power"]["calls"] == 2
+        assert calc.memo.hits == 1
+        calc.disable_memoization()
+        calc.power(2, 3)
+        assert calc.metrics.snapshot()["power"]["calls"] == 3
+
+    def test_metrics_export(self, tmp_path):
+        """Test JSON and Prometheus snapshots are written to files."""
+        calc = Calculator(instrument=True)
+        calc.natural_log(1)
+        with pytest.raises(ValueError):
+            calc.natural_log(0)
+
+        calc.metrics.write(tmp_path / "metrics.json")
+        with open(tmp_path / "metrics.json") as f:
+            assert json.load(f)["natural_log"]["errors"] == {"ValueError": 1}
+
+        calc.metrics.write(tmp_path / "metrics.prom")
+        text = (tmp_path / "metrics.prom").read_text()
+        assert 'calculator_operation_calls_total{operation="natural_log"} 2' in text
+        assert 'calculator_operation_errors_total{operation="natural_log",type="ValueError"} 1' in text
+        assert 'calculator_operation_seconds_bucket{operation="natural_log",le="+Inf"} 2' in text
+
+
+class TestOperationRegistry:
+    """Test class for the table-driven operation registry."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_registry(self, monkeypatch):
+        """Let each test register operations without leaking them."""
+        for name in ("OPERATIONS", "OPERATION_CODES", "EXPRESSION_NAMES", "STATUS_CODES"):
+            monkeypatch.setattr(project, name, dict(getattr(project, name)))
+        for name in ("OPERATION_NAMES", "STATUS_MESSAGES"):
+            monkeypatch.setattr(project, name, list(getattr(project, name)))
+
+    def register_hypot(self):
+        return register_operation(Operation(
+            "hypotenuse", 2, "hypot", "Hypotenuse",
+            func=math.hypot, kernel=np.hypot,
+            checks=[(lambda x, y: (x < 0) | (y < 0), "Sides must be non-negative")],
+        ))
+
+    def test_builtin_dispatch(self):
+        """Test built-in operations dispatch through the registry."""
+        calc = Calculator()
+        assert calc.calculate("divide", 9, 3) == 3
+        with pytest.raises(ValueError, match="Unknown operation: cube"):
+            calc.calculate("cube", 2)
+        with pytest.raises(ValueError, match="add takes 2 operand"):
+            calc.calculate("add", 1)
+        assert project.OPERATIONS["power"].describe(2, 3) == "2 ** 3"
+        assert project.OPERATIONS["natural_log"].describe(5) == "ln(5)"
+
+    def test_third_party_operation(self):
+        """Test a registered operation works everywhere without editing main()."""
+        self.register_hypot()
+        calc = Calculator()
+        assert calc.hypotenuse(3, 4) == 5
+        with pytest.raises(ValueError, match="Sides must be non-negative"):
+            calc.calculate("hypotenuse", -3, 4)
+        assert calc.evaluate("hypot(6, 8) / 2") == 5
+        _, status = calc.checked.hypotenuse(-3, 4)
+        assert project.STATUS_MESSAGES[status] == "Sides must be non-negative"
+
+        result = calc.batch.hypotenuse([3, -1], 4)
+        assert result.values[0] == 5
+        assert result.errors.tolist() == [False, True]
+
+        calc.record("hypotenuse", 5.0, 3.0, 4.0)
+        assert calc.history[0] == "hypot(3.0, 4.0) = 5.0"
+        assert CalculatorServer().respond([b"hypotenuse 5 12"]) == b"ok 13.0\n"
+
+    def test_third_party_menu(self, capsys):
+        """Test registered operations appear in the menu before the utilities."""
+        self.register_hypot()
+        project.display_menu()
+        menu = capsys.readouterr().out
+        assert " 16. Hypotenuse" in menu
+        assert " 19. Quit" in menu
+
+    def test_operation_without_kernel(self):
+        """Test operations without a kernel are still evaluated in batches."""
+        register_operation(Operation("reciprocal", 1, "recip", "Reciprocal",
+                                     func=lambda x: 1 / x))
+        result = Calculator().batch.reciprocal([2, 0, 4])
+        assert result.values[[0, 2]].tolist() == [0.5, 0.25]
+        assert result.errors.tolist() == [False, True, False]
+        assert result.message == "float division by zero"
+
+    def test_invalid_registrations(self):
+        """Test clashing or incomplete registrations are rejected."""
+        with pytest.raises(ValueError, match="already registered"):
+            register_operation(Operation("add", 2, "plus", "Add", func=lambda x, y: x + y))
+        with pytest.raises(ValueError, match="needs a func"):
+            register_operation(Operation("cube", 1, "cube", "Cube"))
+        with pytest.raises(ValueError, match="clashes"):
+            register_operation(Operation("evaluate", 1, "evaluate", "Evaluate", func=abs))
+        with pytest.raises(ValueError, match="already in use"):
+            register_operation(Operation("absolute", 1, "sqrt", "Absolute", func=abs))
+
+
+class TestAdaptivePrecision:
+    """Test class for the adaptive precision mode."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.calc = Calculator(precision="adaptive")
+
+    def test_fast_path_uses_floats(self):
+        """Test ordinary results stay native floats."""
+        assert self.calc.power(2, 10) == 1024.0
+        assert isinstance(self.calc.power(2, 10), float)
+        assert self.calc.power(4, 0.5) == 2.0
+        assert self.calc.exponential(1) == math.e
+
+    def test_exact_integer_power(self):
+        """Test overflow and precision loss escalate to exact integers."""
+        assert self.calc.power(10, 1000) == 10 ** 1000
+        assert self.calc.power(3, 40) == 3 ** 40  # Too big to be exact as a float
+        assert self.calc.power(10.0, 1000.0) == 10 ** 1000
+
+    def test_exact_fraction_and_decimal_results(self):
+        """Test underflow and non-integer exponents use Fraction or Decimal."""
+        assert self.calc.power(10, -400) == Fraction(1, 10 ** 400)
+        result = self.calc.power(10, 400.5)
+        assert isinstance(result, decimal.Decimal)
+        assert result.adjusted() == 400
+        assert self.calc.exponential(1000).adjusted() == 434
+        assert self.calc.exponential(-1000) > 0
+        with pytest.raises(ValueError, match="Cannot raise zero to a negative power"):
+            self.calc.power(0, -5000)
+
+    def test_float_mode_still_raises(self):
+        """Test the default float mode keeps raising on overflow."""
+        with pytest.raises(ValueError, match="Result too large to compute"):
+            Calculator().exponential(1000)
+        with pytest.raises(ValueError, match="Unknown precision mode"):
+            Calculator(precision="exact")
+
+    def test_modular_power(self):
+        """Test modular power with exponentiation by squaring."""
+        assert self.calc.modular_power(4, 13, 497) == 445
+        assert self.calc.modular_power(2, 10 ** 18, 1_000_000_007) == pow(2, 10 ** 18, 1_000_000_007)
+        assert self.calc.modular_power(3, -1, 11) == 4
+        assert power_by_squaring(Fraction(1, 2), 3) == Fraction(1, 8)
+        with pytest.raises(ValueError, match="integer operands"):
+            self.calc.modular_power(2.5, 2, 3)
+        with pytest.raises(ValueError, match="Cannot perform modulo with zero"):
+            self.calc.modular_power(2, 2, 0)
+        with pytest.raises(ValueError, match="no inverse"):
+            self.calc.modular_power(2, -1, 4)
+
+    def test_large_results_in_history(self):
+        """Test results too large for a float record are kept exactly."""
+        result = self.calc.power(10, 30)
+        self.calc.record("power", result, 10, 30)
+        assert self.calc.history[0] == f"10 ** 30 = {10 ** 30}"
+
+    def test_huge_exact_results_stay_printable(self):
+        """Test results beyond MAX_EXACT_DIGITS become Decimals that format."""
+        result = self.calc.power(10, 5000)
+        assert isinstance(result, decimal.Decimal)
+        assert result.adjusted() == 5000
+        assert self.calc.power(10, -5000).adjusted() == -5000
+        self.calc.add_to_history("10 ** 3000 * 10 ** 3000", 10 ** 6000)
+        assert self.calc.history[-1].endswith("E+6000")
+        lines = list(format_results([(1, "x", 10 ** 6000, None)]))
+        assert lines[0].startswith("x = 1.0000") and lines[0].endswith("E+6000\n")
+
+    def test_huge_exponents_skip_exact_arithmetic(self):
+        """Test results far past MAX_EXACT_DIGITS go straight to Decimal."""
+        start = time.perf_counter()
+        assert self.calc.power(2, 1e12).adjusted() == 301029995663
+        assert self.calc.power(0.5, 1e9).adjusted() == -301029996
+        assert self.calc.power(10, 10 ** 6) == decimal.Decimal("1E+1000000")
+        assert time.perf_counter() - start < 1
+
+    def test_decimal_overflow_raises_value_error(self):
+        """Test results past the Decimal exponent range report an overflow."""
+        for operation, operands in (("exponential", (1e300,)), ("power", (10, 1e300))):
+            with pytest.raises(ValueError, match="Result too large to compute"):
+                getattr(self.calc, operation)(*operands)
+            assert getattr(self.calc.checked, operation)(*operands)[1] == STATUS_OVERFLOW
+        with pytest.raises(ValueError, match="Result too large to compute"):
+            self.calc.evaluate("2 ** 1e12 * 10 ** 1e12")
+
+    def test_exact_subnormal_stays_float(self):
+        """Test subnormal results only escalate when the float is inexact."""
+        assert self.calc.power(1e-320, 1.0) == 1e-320
+        assert isinstance(self.calc.power(1e-320, 1.0), float)
+        assert self.calc.power(1e-160, 2.0) == Fraction(1e-160) ** 2
+
+
+class TestApproximateMath:
+    """Test class for the table-driven approximate mode."""
+
+    def test_error_within_bound(self):
+        """Test the verification harness confirms the documented bound."""
+        for max_error in (1e-3, 1e-6):
+            report = verify_approximation(ApproximateMath(max_error), samples=20_000)
+            assert all(entry["ok"] for entry in report.values())
+
+    def test_approximate_batch(self):
+        """Test approximate mode only changes batch sine and cosine."""
+        calc = Calculator(approximate=1e-6)
+        x = np.linspace(-10, 10, 50_001)
+        assert np.max(np.abs(calc.batch.sine(x).values - np.sin(x))) <= 1e-6
+        assert np.max(np.abs(calc.batch.cosine(x).values - np.cos(x))) <= 1e-6
+        assert np.array_equal(calc.batch.exponential(x).values, np.exp(x))
+        assert calc.sine(1.0) == math.sin(1.0)  # Scalar methods stay exact
+
+    def test_special_arguments(self):
+        """Test shapes, huge and non-finite arguments are handled."""
+        approx = ApproximateMath(1e-6)
+        assert approx.sine(np.zeros((2, 3))).shape == (2, 3)
+        assert approx.sine(1e12) == math.sin(1e12)
+        assert np.isnan(approx.cosine([math.inf, math.nan])).all()
+        with pytest.raises(ValueError, match="max_error"):
+            ApproximateMath(0)
+
+
+class TestRunningStats:
+    """Test class for one-pass streaming statistics."""
+
+    def test_basic_statistics(self):
+        """Test count, sum, mean, variance, min and max."""
+        stats = Calculator().statistics([2, 4, 4, 4, 5, 5, 7, 9])
+        assert stats.count == 8
+        assert stats.sum == 40
+        assert stats.mean == 5
+        assert stats.variance == 4
+        assert stats.std == 2
+        assert stats.sample_variance == pytest.approx(32 / 7)
+        assert (stats.min, stats.max) == (2, 9)
+
+    def test_compensated_sum(self):
+        """Test the sum keeps precision a naive running sum loses."""
+        values = [1e16, 1.0, -1e16] * 1000
+        naive = 0.0
+        for v in values:
+            naive += v
+        assert naive != 1000
+        assert RunningStats(values).sum == 1000
+        stats = RunningStats()
+        for v in values:
+            stats.update(v)
+        assert stats.sum == 1000
+
+    def test_stable_variance(self):
+        """Test variance stays accurate with a large offset."""
+        values = np.array([4.0, 7.0, 13.0, 16.0]) + 1e9
+        assert RunningStats(values).variance == pytest.approx(22.5)
+
+    def test_streams_generators_and_arrays(self):
+        """Test generators and arrays larger than one chunk agree."""
+        data = np.random.default_rng(0).normal(3, 2, 200_000)
+        from_array = RunningStats(data)
+        from_generator = RunningStats(float(v) for v in data)
+        assert from_array.count == from_generator.count == 200_000
+        assert from_array.mean == pytest.approx(data.mean())
+        assert from_generator.variance == pytest.approx(data.var())
+        assert from_array.max == data.max()
+
+    def test_merge_partial_results(self):
+        """Test merging chunk results matches a single pass."""
+        data = np.random.default_rng(1).uniform(-5, 5, 10_001)
+        parts = [RunningStats(chunk) for chunk in np.array_split(data, 7)]
+        merged = RunningStats.combine(parts)
+        whole = RunningStats(data)
+        assert merged.count == whole.count
+        assert merged.sum == pytest.approx(whole.sum, abs=1e-9)
+        assert merged.variance == pytest.approx(whole.variance)
+        assert (merged.min, merged.max) == (whole.min, whole.max)
+
+    def test_empty(self):
+        """Test an empty stream has NaN statistics."""
+        summary = RunningStats().summary()
+        assert summary["count"] == 0 and summary["sum"] == 0
+        assert math.isnan(summary["mean"]) and math.isnan(summary["variance"])
+
+
+class TestExpressionGraph:
+    """Test class for the lazy expression DAG."""
+
+    def test_shared_subexpressions(self):
+        """Test identical subexpressions become a single node."""
+        graph = ExpressionGraph()
+        graph.define("a", "sin(x) * 2")
+        graph.define("b", "sin(x) + cos(y)")
+        # Nodes: x, y, 2, sin(x), cos(y), sin(x) * 2, sin(x) + cos(y)
+        assert len(graph) == 7
+        graph.set(x=1.0, y=0.0)
+        assert graph["a"] == pytest.approx(2 * math.sin(1))
+        assert graph["b"] == pytest.approx(math.sin(1) + 1)
+        assert graph.evaluations == 4  # sin(x) computed once
+
+    def test_incremental_recompute(self):
+        """Test only nodes depending on a changed input are recomputed."""
+        graph = ExpressionGraph()
+        graph.define("r", "sqrt(x**2 + y**2)")
+        graph.define("scaled", "r / log10(z)")
+        graph.set(x=3.0, y=4.0, z=100.0)
+        assert graph["scaled"] == 2.5
+        evaluations = graph.evaluations
+
+        graph.set(z=10.0)
+        assert graph["scaled"] == 5.0
+        assert graph.evaluations == evaluations + 2  # log10(z) and the division
+
+        graph.set(z=10.0)  # Unchanged value
+        assert graph["scaled"] == 5.0
+        assert graph.evaluations == evaluations + 2
+
+    def test_graph_errors(self):
+        """Test errors are cached per node and cleared by new inputs."""
+        graph = ExpressionGraph()
+        graph.define("f", "1 / -x")
+        with pytest.raises(ValueError, match="Undefined variable: x"):
+            graph["f"]
+        graph.set(x=0.0)
+        with pytest.raises(ValueError, match="Cannot divide by zero"):
+            graph["f"]
+        graph.set(x=4.0)
+        assert graph["f"] == -0.25
+        with pytest.raises(ValueError, match="Name already in use"):
+            graph.define("f", "x")
+        with pytest.raises(ValueError, match="Unknown input"):
+            graph.set(w=1)
+
+    def test_graph_signed_zero_and_complex_intermediates(self):
+        """Test -0.0 counts as a new input and complex intermediates fail cleanly."""
+        graph = ExpressionGraph()
+        graph.define("s", "sin(x)")
+        graph.define("r", "sqrt(x ** 0.5)")
+        graph.set(x=0.0)
+        assert math.copysign(1, graph["s"]) == 1
+        graph.set(x=-0.0)
+        assert math.copysign(1, graph["s"]) == -1
+        graph.set(x=-4.0)
+        for _ in range(2):  # The error is cached on the node
+            with pytest.raises(ValueError, match="Operands must be real numbers"):
+                graph["r"]
+        assert not graph.formulas["r"].dirty
+
+
+class TestPipeline:
+    """Test class for fused, cache-blocked operation pipelines."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.batch = Calculator().batch
+
+    def test_chain_matches_batch_calls(self):
+        """Test a fused chain gives the same values as separate batch calls."""
+        x = np.linspace(-720, 720, 1001)
+        result = Pipeline.chain("degrees_to_radians", "sine", block_size=64)(x)
+        expected = self.batch.sine(self.batch.degrees_to_radians(x).values)
+        assert result.ok and np.array_equal(result.values, expected.values)
+        assert repr(Pipeline.chain(("power", 2), "square_root")) == "Pipeline('sqrt(x ** 2.0)')"
+
+    def test_expression_reuses_buffers(self):
+        """Test an expression over several inputs needs only two block buffers."""
+        pipeline = Pipeline("sqrt(x*x + y*y)", block_size=100)
+        assert pipeline.variables == ["x", "y"] and pipeline._buffers == 2
+        x, y = np.arange(1000.0), np.arange(1000.0)[::-1]
+        assert np.allclose(pipeline(x, y=y).values, np.hypot(x, y))
+        with pytest.raises(ValueError, match="Undefined variable: y"):
+            pipeline(x)
+
+    def test_errors_propagate(self):
+        """Test domain errors are masked through later steps with the first message."""
+        x = np.array([-1.0, 0.0, 1.0, 1000.0, 4.0])
+        result = Pipeline("exp(sqrt(x)) / log10(x)", block_size=2)(x)
+        assert result.errors.tolist() == [True, True, True, False, False]
+        assert result.message == "Cannot calculate square root of negative number"
+        assert np.isnan(result.values[:3]).all()
+        assert result.values[4] == pytest.approx(math.exp(2) / math.log10(4))
+        assert Pipeline("exp(sqrt(x)) / log10(x)")(x[3:]).message is None
+
+    def test_output_into_existing_array(self, tmp_path):
+        """Test results can be written straight into a memory-mapped column."""
+        out = np.lib.format.open_memmap(tmp_path / "out.npy", mode="w+", shape=(50,))
+        Pipeline.chain(("multiply", 2), ("add", 1), block_size=8)(np.arange(50.0), out=out)
+        out.flush()
+        assert np.array_equal(np.load(tmp_path / "out.npy"), np.arange(50.0) * 2 + 1)
+
+
+class TestSolvers:
+    """Test class for the vectorized root finders and integrator."""
+
+    def test_bisection_many_problems(self):
+        """Test bisection solves every problem to tolerance with its own mask."""
+        a = np.linspace(0.5, 100, 1000)
+        result = bisect_roots("x**2 - a", 0, 11, a=a)
+        assert result.ok and np.allclose(result.values, np.sqrt(a), rtol=1e-11)
+        assert result.iterations.max() <= 50
+
+        result = bisect_roots("x - 5", 0, [1, 10, 5])
+        assert result.errors.tolist() == [True, False, False]
+        assert result.message == "Root is not bracketed"
+        assert np.isnan(result.values[0]) and result.values[1:].tolist() == [5, 5]
+        assert result.iterations[2] == 0  # A root on the bracket needs no work
+
+    def test_newton(self):
+        """Test Newton's method with numeric and symbolic derivatives."""
+        a = np.array([[2.0, 9.0], [0.25, 1e6]])
+        for derivative in (None, "2 * x"):
+            result = newton_roots("x**2 - a", 1, derivative=derivative, a=a)
+            assert result.ok and result.values.shape == (2, 2)
+            assert np.allclose(result.values, np.sqrt(a), rtol=1e-12)
+
+    def test_newton_failures(self):
+        """Test domain errors, flat derivatives and non-convergence per problem."""
+        result = newton_roots("ln(x)", [2, -1, 0.5])
+        assert result.errors.tolist() == [False, True, False]
+        assert result.converged.tolist() == [True, False, True]
+        assert result.message == "Logarithm undefined for non-positive numbers"
+
+        assert newton_roots("x * x - 4", 0).message == "Zero or non-finite derivative"
+        result = newton_roots("x**2 + 1", 1.0, max_iterations=10)
+        assert not result.ok and not result.errors.any()
+        assert result.message == "Did not converge"
+        with pytest.raises(ValueError, match="Undefined variable: a"):
+            newton_roots("x - a", 1)
+
+    def test_integrate(self):
+        """Test adaptive integration over many intervals and parameters."""
+        k = np.linspace(0.1, 3, 500)
+        result = integrate("sin(k * x)", 0, math.pi, k=k)
+        assert result.ok
+        assert np.allclose(result.values, (1 - np.cos(k * math.pi)) / k, atol=1e-8)
+        assert integrate("exponential", 0, [1, 2]).values == pytest.approx(np.exp([1, 2]) - 1)
+
+        result = integrate("1 / x", [-1, 1], [1, 2])
+        assert result.errors.tolist() == [True, False]
+        assert result.message == "Cannot divide by zero"
+        assert result.values[1] == pytest.approx(math.log(2))
+
+
+class TestCheckedAPI:
+    """Test class for the non-raising (result, status) API."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.calc = Calculator()
+        self.checked = self.calc.checked
+
+    def test_valid_operands(self):
+        """Test valid operands give the normal result and STATUS_OK."""
+        assert self.checked.divide(10, 4) == (2.5, STATUS_OK)
+        assert self.checked.apply("square_root", 16) == (4.0, STATUS_OK)
+        assert self.checked.log_base_10(1000) == (pytest.approx(3), STATUS_OK)
+
+    @pytest.mark.parametrize("name, operands", [
+        ("divide", (1, 0)),
+        ("modulo", (5, 0)),
+        ("square_root", (-4,)),
+        ("natural_log", (0,)),
+        ("log_base_10", (-1,)),
+        ("power", (10, 400)),
+        ("exponential", (1000,)),
+    ])
+    def test_status_matches_raised_message(self, name, operands):
+        """Test each failure returns NaN and the code of the message the method raises."""
+        value, status = self.checked.apply(name, *operands)
+        assert math.isnan(value) and status not in (STATUS_OK, STATUS_FAILED)
+        with pytest.raises(ValueError) as raised:
+            getattr(self.calc, name)(*operands)
+        assert STATUS_MESSAGES[status] == str(raised.value)
+
+    def test_unanticipated_errors_and_modes(self):
+        """Test other errors map to STATUS_FAILED and adaptive mode is honoured."""
+        value, status = self.checked.power(0, -1)
+        assert math.isnan(value) and status == STATUS_FAILED
+        assert self.checked.exponential(1000)[1] == STATUS_OVERFLOW
+        assert Calculator(precision="adaptive").checked.power(10, 400) == (10 ** 400, STATUS_OK)
+
+    def test_uses_memoization(self):
+        """Test the checked API goes through memoization once it is enabled."""
+        self.calc.enable_memoization(16)
+        for _ in range(3):
+            assert self.calc.checked.natural_log(-1)[1] != STATUS_OK
+            assert self.calc.checked.natural_log(1.0) == (0.0, STATUS_OK)
+        assert self.calc.memo.info()["hits"] == 2
+        with pytest.raises(ValueError, match="takes 2 operand"):
+            self.calc.checked.apply("divide", 1)
+
+
+class TestThreadSafety:
+    """Stress tests for sharing one Calculator between many threads."""
+
+    THREADS = 16
+    RECORDS = 2000
+
+    def run_threads(self, target):
+        """Start THREADS threads running target(index) together and join them."""
+        barrier = threading.Barrier(self.THREADS)
+        failures = []
+
+        def run(index):
+            barrier.wait()
+            try:
+                target(index)
+            except Exception as e:  # Reported by the main thread
+                failures.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert failures == []
+
+    def test_concurrent_history_keeps_every_record_in_order(self):
+        """Test no record is lost or interleaved and each thread's order holds."""
+        calc = Calculator(history_size=self.THREADS * self.RECORDS)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Switch threads as often as possible
+        try:
+            self.run_threads(lambda t: [
+                calc.record("add", float(t * self.RECORDS + i), float(t), float(i))
+                for i in range(self.RECORDS)
+            ])
+        finally:
+            sys.setswitchinterval(interval)
+
+        history = list(calc.history)
+        assert len(history) == self.THREADS * self.RECORDS
+        per_thread = {}
+        for line in history:
+            x, _, y = line.split(" = ")[0].split()
+            per_thread.setdefault(x, []).append(float(y))
+        assert all(ys == list(map(float, range(self.RECORDS))) for ys in per_thread.values())
+
+    def test_history_memory_bounded_as_threads_come_and_go(self):
+        """Test finished threads' shards are pruned and only grow as needed."""
+        capacity = 100
+        calc = Calculator(history_size=capacity)
+        for i in range(1000):
+            thread = threading.Thread(target=calc.record, args=("add", float(i), float(i), 0.0))
+            thread.start()
+            thread.join()
+        shards = calc.history._shards
+        assert len(shards) <= 2 * capacity
+        assert sum(len(shard._codes) for shard in shards) <= 2 * capacity * HISTORY_INITIAL_SLOTS
+        assert len(calc.history) == capacity
+        assert calc.history[-1] == "999.0 + 0.0 = 999.0"
+        calc.history[:]  # A full read keeps only shards holding the newest records
+        assert len(calc.history._shards) == capacity
+
+    def test_concurrent_first_batch_use(self):
+        """Test threads racing to the first batch call all see a loaded NumPy.
+
+        Runs in a fresh interpreter, where NumPy has not been imported yet.
+        """
+        code = f"""
+import threading, project
+calc = project.Calculator()
+barrier = threading.Barrier({self.THREADS})
+failures = []
+
+def run():
+    barrier.wait()
+    try:
+        assert calc.batch.sine([0.0, 1.0]).values[0] == 0.0
+    except Exception as e:
+        failures.append(repr(e))
+
+threads = [threading.Thread(target=run) for _ in range({self.THREADS})]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(failures)
+"""
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(project.__file__)).stdout
+        assert output == "[]\n"
+
+    def test_clear_and_reads_race_with_appends(self):
+        """Test clearing and reading while other threads append never fails."""
+        calc = Calculator(history_size=100, cache_size=64)
+
+        def work(index):
+            for i in range(self.RECORDS):
+                if index == 0 and i % 100 == 0:
+                    calc.clear_history()
+                    assert len(calc.history[-10:]) <= 10
+                calc.add_to_history(f"sin({i})", calc.sine(i % 50))
+                calc.evaluate(f"{i % 300} * 2")
+
+        self.run_threads(work)
+        assert len(calc.history) == 100
+        calc.clear_history()
+        assert list(calc.history) == []
+
+
 # Test functions that might be used outside the Calculator class
 def test_calculator_instantiation():
     """Test that Calculator can be instantiated properly."""